@@ -1,30 +1,57 @@
 import argparse
-import fcntl
-import io
+import itertools
 import os
 import pathlib
-import struct
 import sys
-import termios
-from typing import Callable, Iterable, TextIO
-
-from PIL import Image
-
-from . import pxp
-from .args import DitherMethod, parse_args
-from .chars import PairCharset
-from .img import (
-    ImgData,
-    ThresholdFunc,
-    get_threshold_func,
-    plot_brightness_and_threshold,
-    sharpen,
-    thr_local_avg_factory,
+from typing import TYPE_CHECKING, Any, Callable, Iterable, TextIO
+
+from .args import parse_args
+from .sink import Sink
+from .timing import record, span, timed
+from .util import Debug, Level
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+    from .pipeline import (
+        decode_image,
+        get_zoom_factor,
+        load_image_file,
+        plot_image_histogram,
+        prepare_image,
+        rasterize,
+        reduce_image,
+        render,
+    )
+
+__all__ = [
+    'cached_render', 'decode_image', 'get_ioctl_windowsize', 'get_zoom_factor',
+    'load_image_file', 'main', 'plot_image_histogram', 'prepare_image',
+    'rasterize', 'reduce_image', 'render', 'run', 'terminal_rcwh',
+    'write_rows',
+]
+PIPELINE_EXPORTS = (
+    'decode_image', 'get_zoom_factor', 'load_image_file',
+    'plot_image_histogram', 'prepare_image', 'rasterize', 'reduce_image',
+    'render',
 )
-from .util import Debug
+
+
+def __getattr__(name: str) -> Any:
+    '''
+    import image processing on first use only, so that `--help`, argument
+    errors and cache hits get by without loading pillow.
+    '''
+    if name in PIPELINE_EXPORTS:
+        from . import pipeline
+        return getattr(pipeline, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def get_ioctl_windowsize(dev: TextIO) -> tuple[int, int, int, int]:
+    import fcntl
+    import struct
+    import termios
     fd = dev.fileno()
     return struct.unpack(
         'HHHH', fcntl.ioctl(
@@ -39,23 +66,27 @@ def _terminal_rcwh(dev: TextIO) -> tuple[int, int, int, int]:
         r, c, w, h = get_ioctl_windowsize(dev)
         assert w * h > 0, f'invalid dimensions: {w}×{h} ({c}cols{r}rows)'
         Debug.log(
-            f'terminal size determined via ioctl for device {dev}'
+            'terminal size determined via ioctl for device %s', dev,
         ).log(
-            f'terminal size: {c}×{r} columns×rows'
+            'terminal size: %d×%d columns×rows', c, r,
         ).log(
-            f'window size: {w}×{h} px'
+            'window size: %d×%d px', w, h,
         )
         return r, c, w, h
     except Exception as e:
-        Debug.log(f'could not determine terminal dimensions: {e}')
+        Debug.log(
+            'could not determine terminal dimensions: %s', e,
+            level=Level.warning,
+        )
     if 'r' not in locals() or r * c == 0:
+        import termios
         r, c = termios.tcgetwinsize(dev)
     if r * c > 0:
         Debug.log(
             'terminal size determined using termios.tcgetwinsize '
-            f'for device {dev}'
+            'for device %s', dev,
         ).log(
-            f'terminal size: {c}×{r} columns×rows'
+            'terminal size: %d×%d columns×rows', c, r,
         ).log(
             'window size made up based on terminal size'
         )
@@ -69,7 +100,7 @@ def terminal_rcwh(
     if TERM_RCWH := os.environ.get('TERM_RCWH'):
         values = TERM_RCWH.split('x')
         Debug.log(
-            f'got fixed term size from TERM_RCWH env var: {"×".join(values)}'
+            'got fixed term size from TERM_RCWH env var: %s', '×'.join(values),
         )
         if len(values) == 4:
             r, c, w, h = list(map(int, values))
@@ -78,110 +109,92 @@ def terminal_rcwh(
             w, h = c * 9, r * 19
         else:
             msg = f'wrong number of values in TERM_RCWH: {values}'
-            Debug.log(msg)
+            Debug.log(msg, level=Level.warning)
             raise ValueError(msg)
         return (r, c, w, h)
     for dev in (stdout, stdin):
         try:
             return _terminal_rcwh(dev)
         except Exception as e:
-            Debug.log(f'getting terminal size failed for device {dev}: {e}')
+            Debug.log(
+                'getting terminal size failed for device %s: %s', dev, e,
+                level=Level.warning,
+            )
     return fallback_values
 
 
-def get_zoom_factor(
-    image: Image.Image, zoom_factor: float,
-    rcwh_func: Callable[
-        [], tuple[int, int, int, int]
-    ] = terminal_rcwh,
-) -> float:
-    if zoom_factor <= 0:
-        r, c, w, h = rcwh_func()
-        zoom_factor = w / image.width
-    Debug.log(f'resize image to {zoom_factor*100:.1f}%')
-    return zoom_factor
-
-
-def load_image_file(filename: str) -> Image.Image:
-    if filename != '-':
-        Debug.log(f'input file: {filename}')
-        return Image.open(pathlib.Path(filename)).copy()
-    byteinput = sys.stdin.buffer.read()
-    try:
-        result = Image.open(
-            filename := byteinput.decode('utf8').strip()
-        ).copy()
-        Debug.log(f'input file: {filename}')
-        return result
-    except Exception:
-        ...
-    return Image.open(io.BytesIO(byteinput)).copy()
-
-
-def plot_image_histogram(
-    image: Image.Image, options: argparse.Namespace,
-    charset: PairCharset = 'blocks',
-) -> int:
-    if image.mode != 'L':
-        image = image.convert('L')
-    for line in plot_brightness_and_threshold(
-        image, options, charset=charset,
-    ):
-        print(line)
-    if options.debug:
-        Debug.show(sys.stderr)
-    return 0
-
-
-def rasterize(
-    image: Image.Image,
-    zoom: float = 1,
-    inverted: bool = False,
-    crop_y: bool = False,
-    edging: int = 0,
-    dither: float = 0,
-    dither_method: DitherMethod = DitherMethod.atkinson,
-    adjust_brightness: float = 1,
-    threshold_func: ThresholdFunc | None = None,
-    interpolate: bool = True,
-    rcwh_func: Callable[
-        [], tuple[int, int, int, int]
-    ] = terminal_rcwh,
+def cached_render(
+    options: argparse.Namespace,
+    load_image_file_func: Callable[[str], 'Image.Image'] | None = None,
 ) -> Iterable[str]:
-    threshold = threshold_func or thr_local_avg_factory(image, 0)
-    r, c, w, h = rcwh_func()
-    image = sharpen(image, edging, w / c / 2)
-    if image.mode != 'L':
-        image = image.convert('L')
-    yield from pxp.rasterize(
-        ImgData(image), r, c, w, h,
-        threshold=threshold,
-        zoom=zoom,
-        interpolate=interpolate,
-        crop_y=crop_y,
-        dither_method=dither_method,
-        adjust_brightness=adjust_brightness,
-        dither=dither,
-        inverted=inverted,
+    '''
+    render input image unless its rows can be found in the render cache, if
+    one is in use. the image only gets loaded if it needs to be rendered.
+    '''
+    rcwh = terminal_rcwh()
+
+    def rows() -> Iterable[str]:
+        with span('import'):
+            from . import pipeline
+        with span('load'):
+            image = (load_image_file_func or pipeline.load_image_file)(
+                options.inputfile
+            )
+        Debug.log('image dimensions: %d×%d', *image.size)
+        return pipeline.render(image, options, rcwh_func=lambda: rcwh)
+
+    if not options.cache_dir or options.inputfile == '-':
+        yield from rows()
+        return
+    from .cache import RenderCache, cache_key, content_digest
+    cache = RenderCache(options.cache_dir, int(options.cache_size * 2**20))
+    key = cache_key(
+        content_digest(pathlib.Path(options.inputfile)), options, rcwh,
     )
-
-
-def printr(line: str, file: io.TextIOWrapper) -> str:
-    out = (
-        f'\033[38;5;231m{line}\033[0m' if file.isatty()
-        else f'{line}'
+    yield from cache.rows(key, rows)
+    if options.cache_stats:
+        print(cache.stats(), file=sys.stderr)
+
+
+def write_rows(options: argparse.Namespace, rows: Iterable[str]) -> int:
+    '''
+    write rendered rows to the output file, which only gets created once the
+    first row has been rendered successfully.
+    '''
+    rows = iter(rows)
+    first_row = list(itertools.islice(rows, 1))
+    options.outputfile.touch(
+        mode=0o644, exist_ok=options.output_overwrite,
     )
-    print(out, file=file)
-    return out
+    shown = Debug.show(sys.stderr) if options.debug else 0
+    fd = os.open(options.outputfile, os.O_WRONLY | os.O_TRUNC)
+    try:
+        sink = Sink.to_fd(fd, trim=options.trim)
+        sink.frame(itertools.chain(first_row, rows))
+        sink.close()
+    finally:
+        os.close(fd)
+    if options.debug:
+        Debug.show(sys.stderr, since=shown)
+    return 0
 
 
 def main(
     argv: list[str] = sys.argv[1:],
-    load_image_file_func: Callable[
-        [str], Image.Image
-    ] = load_image_file,
+    load_image_file_func: Callable[[str], 'Image.Image'] | None = None,
 ) -> int:
     options = parse_args(argv)
+    with Debug.scope(enabled=options.debug):
+        return run(options, load_image_file_func)
+
+
+def run(
+    options: argparse.Namespace,
+    load_image_file_func: Callable[[str], 'Image.Image'] | None = None,
+) -> int:
+    if options.serve:
+        from .serve import serve
+        return serve(options)
     if not options.output_overwrite and options.outputfile.exists():
         print(
             f'output file {options.outputfile} already exists! '
@@ -189,33 +202,24 @@ def main(
             file=sys.stderr
         )
         sys.exit(1)
-    image = load_image_file_func(options.inputfile)
-    Debug.log(f'image dimensions: {"×".join(map(str, image.size))}')
-    if options.histogram:
-        return plot_image_histogram(
-            image, options,
-            charset='blocks' if os.isatty(1) else 'ascii',
+    if options.watch:
+        from .watch import watch_file
+        return watch_file(options)
+    if options.histogram or options.play:
+        from .pipeline import show_image
+        return show_image(options, load_image_file_func)
+    if not options.timings:
+        return write_rows(options, cached_render(options, load_image_file_func))
+    with record() as timings:
+        write_rows(
+            options,
+            timed('render', cached_render(options, load_image_file_func)),
         )
-    rows = list(rasterize(
-        image,
-        zoom=get_zoom_factor(image, options.zoom_factor),
-        inverted=options.invert,
-        interpolate=not options.disable_antialiasing,
-        crop_y=options.crop_y,
-        edging=options.sharpen,
-        dither=options.error_preservation_factor,
-        dither_method=options.dither_method,
-        threshold_func=get_threshold_func(image, options),
-        adjust_brightness=options.brightness / 100,
-    ))
-    options.outputfile.touch(
-        mode=0o644, exist_ok=options.output_overwrite,
+    print(
+        *(timings.table() if options.timings == 'table' else
+          timings.json_lines()),
+        sep='\n', file=sys.stderr,
     )
-    if options.debug:
-        Debug.show(sys.stderr)
-    with options.outputfile.open('w') as f:
-        for row in rows:
-            printr(row, file=f)
     return 0
 
 
@@ -0,0 +1,144 @@
+import argparse
+import contextlib
+import io
+import itertools
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+
+from PIL import Image
+
+from . import terminal_rcwh
+from .args import Redraw
+from .pipeline import render
+from .redraw import OUTPUT_STYLE, Screen
+from .util import Debug
+
+PREFETCH_FRAMES = 4
+DEFAULT_FRAME_DURATION = .1
+
+
+@dataclass
+class Frame:
+    index: int
+    image: Image.Image
+    duration: float
+
+
+def frames(image: Image.Image, loops: int = 1) -> Iterator[Frame]:
+    '''
+    decode frames of a (possibly) animated image together with their display
+    durations in seconds. repeats all frames `loops` times, or endlessly if
+    `loops` is 0.
+
+    >>> image = Image.new('L', (2, 2))
+    >>> [(frame.index, frame.duration) for frame in frames(image, loops=2)]
+    [(0, 0.1), (0, 0.1)]
+    '''
+    for _ in itertools.count() if loops < 1 else range(loops):
+        for index in range(getattr(image, 'n_frames', 1)):
+            image.seek(index)
+            duration = image.info.get('duration') or 0
+            yield Frame(
+                index, image.copy(),
+                duration / 1000 or DEFAULT_FRAME_DURATION,
+            )
+
+
+class Prefetch[T]:
+    '''
+    consume `items` on a background thread which keeps up to `size` of them
+    ready in a bounded queue.
+
+    >>> list(Prefetch(range(10), size=2))
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+    '''
+    def __init__(self, items: Iterable[T], size: int = PREFETCH_FRAMES):
+        self.items = items
+        self.ready: queue.Queue[tuple[T] | Exception | None] = queue.Queue(
+            size
+        )
+        self.stop = threading.Event()
+
+    def put(self, entry: tuple[T] | Exception | None) -> bool:
+        while not self.stop.is_set():
+            try:
+                self.ready.put(entry, timeout=.05)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(self) -> None:
+        try:
+            for item in self.items:
+                if not self.put((item,)):
+                    return
+        except Exception as e:
+            self.put(e)
+            return
+        self.put(None)
+
+    def __iter__(self) -> Iterator[T]:
+        thread = threading.Thread(target=self.produce, daemon=True)
+        thread.start()
+        try:
+            while (entry := self.ready.get()) is not None:
+                if isinstance(entry, Exception):
+                    raise entry
+                yield entry[0]
+        finally:
+            self.stop.set()
+            thread.join()
+
+
+def play(
+    image: Image.Image, options: argparse.Namespace,
+    file: io.TextIOWrapper,
+    rcwh_func: Callable[
+        [], tuple[int, int, int, int]
+    ] = terminal_rcwh,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep,
+) -> int:
+    '''
+    play all frames of an animated image, each for its own duration. frames
+    whose time slot has already passed when they come up get skipped, so
+    that playback keeps pace even if writing to the terminal can't. on a
+    terminal, frames get drawn over each other, by default rewriting only
+    characters that changed.
+    '''
+    rcwh = rcwh_func()
+    played = dropped = 0
+    screen = Screen(style=OUTPUT_STYLE, rows=rcwh[0]) if (
+        file.isatty()
+    ) else None
+    due: float | None = None
+    for frame in Prefetch(frames(image, loops=options.loops)):
+        due = (clock() if due is None else due) + frame.duration
+        if clock() > due:
+            dropped += 1
+            Debug.log('frame %d: dropped', frame.index)
+            continue
+        start = clock()
+        # keep the rendering log of the first frame only
+        with Debug.scope(enabled=False) if played else contextlib.nullcontext():
+            lines = list(render(frame.image, options, rcwh_func=lambda: rcwh))
+        # lines with colors don't line up with the screen by length
+        diff = options.redraw == Redraw.diff and not options.color
+        out = (
+            screen.update(lines, diff=diff) if screen
+            else ''.join(f'{line}\n' for line in lines)
+        )
+        file.write(out)
+        file.flush()
+        played += 1
+        Debug.log(
+            'frame %d: rendered in %.1fms, wrote %d bytes',
+            frame.index, (clock() - start) * 1000, len(out.encode()),
+        )
+        sleep(max(0, due - clock()))
+    Debug.log('played %d frames, dropped %d', played, dropped)
+    return 0
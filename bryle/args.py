@@ -1,12 +1,31 @@
 import argparse
+import os
 import pathlib
 import textwrap
 from enum import StrEnum
 from typing import Callable
 
-from .img import THRESHOLD_FUNC_FACTORIES
+# threshold modes, with value range and default of the threshold argument
+THRESHOLD_MODES: dict[str, tuple[tuple[int, int] | None, int | None]] = {
+    'extrema': (None, None),
+    'median': (None, None),
+    'percentile': ((0, 99), 50),
+    'const': ((0, 255), 127),
+    'local': ((0, 9999), None),
+    'gaussian': ((0, 9999), None),
+}
 
-DitherMethod = StrEnum('DitherMethod', ['atkinson', 'floyd-steinberg'])
+DitherMethod = StrEnum(
+    'DitherMethod',
+    ['atkinson', 'floyd-steinberg', 'bayer2', 'bayer4', 'bayer8', 'blue-noise'],
+)
+Engine = StrEnum('Engine', ['python', 'numpy', 'parallel'])
+Redraw = StrEnum('Redraw', ['diff', 'full'])
+TimingsFormat = StrEnum('TimingsFormat', ['table', 'json'])
+ColorMode = StrEnum('ColorMode', ['256', 'truecolor'])
+Resampling = StrEnum(
+    'Resampling', ['point', 'nearest', 'bilinear', 'box', 'lanczos']
+)
 
 
 def thr_arg_value_range_constraints(
@@ -29,12 +48,97 @@ def non_negative_float(src: str) -> float:
     raise ValueError(f'{value} must be positive')
 
 
-def parse_args(argv: list[str]) -> argparse.Namespace:
+def add_batch_arguments(argp: argparse.ArgumentParser) -> None:
+    argp.add_argument(
+        'inputfiles', type=str, metavar='FILE', nargs='*',
+        help=(
+            'input image files or glob patterns. a newline-separated list of '
+            'paths gets read from stdin if none are given or for "-".'
+        ),
+    )
+    argp.add_argument(
+        '-j', '--jobs', dest='jobs', type=int, default=os.cpu_count() or 1,
+        metavar='N',
+        help='number of worker processes (default: %(default)s).',
+    )
+
+
+def add_single_image_arguments(argp: argparse.ArgumentParser) -> None:
+    '''
+    options for rendering a single image, which don't apply to batches.
+    '''
+    argp_cache = argp.add_argument_group('cache options')
+    argp_cache.add_argument(
+        '--cache', dest='cache_dir', type=pathlib.Path, metavar='DIR',
+        default=os.environ.get('BRYLE_CACHE_DIR'),
+        help=(
+            'keep rendered output in a cache directory and reuse it for '
+            'the same image, options and terminal size '
+            '(default: $BRYLE_CACHE_DIR if set).'
+        ),
+    )
+    argp_cache.add_argument(
+        '--no-cache', dest='cache_dir', action='store_const', const=None,
+        help='don\'t use a cache directory.',
+    )
+    argp_cache.add_argument(
+        '--cache-size', dest='cache_size', type=non_negative_float,
+        default=64, metavar='MIB',
+        help=(
+            'delete least recently used cache entries beyond this size '
+            '(default: %(default)s).'
+        ),
+    )
+    argp_cache.add_argument(
+        '--cache-stats', dest='cache_stats', action='store_true',
+        help='print cache usage to /dev/stderr.',
+    )
+    argp_watch = argp.add_argument_group('watch options')
+    argp_watch.add_argument(
+        '-W', '--watch', dest='watch', action='store_true',
+        help='render input file again every time it changes.',
+    )
+    argp_watch.add_argument(
+        '--poll', dest='poll_interval', type=non_negative_float,
+        default=.25, metavar='SECONDS',
+        help=(
+            'how often to check the watched file for changes. changes only '
+            'get rendered once the file has stayed the same for that long '
+            '(default: %(default)s).'
+        ),
+    )
+    argp_anim = argp.add_argument_group('animation options')
+    argp_anim.add_argument(
+        '-P', '--play', dest='play', action='store_true',
+        help=(
+            'play all frames of animated images (GIF, APNG, WebP), '
+            'skipping frames if output can\'t keep up.'
+        ),
+    )
+    argp_anim.add_argument(
+        '--redraw', dest='redraw', metavar='MODE',
+        choices=tuple(map(str, Redraw)), default='diff',
+        help=(
+            'how to update frames in the terminal: diff only rewrites '
+            'characters that changed, full reprints every frame entirely '
+            f'(one of {"|".join(map(str, Redraw))}, default: %(default)s).'
+        ),
+    )
+    argp_anim.add_argument(
+        '--loops', dest='loops', type=int, default=1, metavar='N',
+        help=(
+            'number of times to play an animation, 0 for endlessly '
+            '(default: %(default)s).'
+        ),
+    )
+
+
+def parse_args(argv: list[str], batch: bool = False) -> argparse.Namespace:
     argp_thr = argparse.ArgumentParser(add_help=False)
-    threshold_choices = tuple(THRESHOLD_FUNC_FACTORIES.keys())
+    threshold_choices = tuple(THRESHOLD_MODES.keys())
     thr_modes_requiring_args = tuple(
-        mode for mode, properties in THRESHOLD_FUNC_FACTORIES.items()
-        if properties[2]
+        mode for mode, properties in THRESHOLD_MODES.items()
+        if properties[1]
     )
     thr_mode_arg_name = 'threshold'
     argp_thr.add_argument(
@@ -52,17 +156,46 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
     argp_out.add_argument(
         '-o', '--output', dest='outputfile', type=pathlib.Path,
         metavar='FILE', default=stdout_path,
-        help='output file (default: %(default)s).',
+        help=(
+            'output file name template which can refer to {stem}, {name}, '
+            '{suffix}, {parent} and {index} of each input file '
+            '(default: %(default)s).' if batch
+            else 'output file (default: %(default)s).'
+        ),
     )
     out_options, _ = argp_out.parse_known_args(argv)
 
+    argp_serve = argparse.ArgumentParser(add_help=False)
+    argp_serve_group = argp_serve.add_argument_group('daemon options')
+    argp_serve_group.add_argument(
+        '--serve', dest='serve', type=pathlib.Path, metavar='SOCKET',
+        help=(
+            'run as a render daemon listening on unix domain socket SOCKET '
+            'for requests from bra-client, instead of rendering FILE.'
+        ),
+    )
+    argp_serve_group.add_argument(
+        '--max-renders', dest='max_renders', type=int, metavar='N',
+        default=os.cpu_count() or 1,
+        help='number of renders running at once (default: %(default)s).',
+    )
+    argp_serve_group.add_argument(
+        '--image-cache', dest='image_cache', type=int, metavar='N',
+        default=16,
+        help='number of decoded images kept in memory (default: %(default)s).',
+    )
+    serve_options, _ = argp_serve.parse_known_args(argv)
+
     argp = argparse.ArgumentParser(
         description=textwrap.dedent(
             '''
             rasterize an image into the terminal.
             '''
         ),
-        parents=[argp_thr, argp_out],
+        parents=(
+            [argp_thr, argp_out] if batch
+            else [argp_thr, argp_out, argp_serve]
+        ),
         epilog=(
             '%(prog)s reads the environment variable TERM_RCWH which when set '
             'bypasses any attempt at determining actual terminal && xterm '
@@ -73,10 +206,14 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
             'and columns and `WxH` is window width and hieght in pixels.'
         ),
     )
-    argp.add_argument(
-        'inputfile', type=str, metavar='FILE',
-        help='path to input image file, or "-" to read from stdin.',
-    )
+    if batch:
+        add_batch_arguments(argp)
+    else:
+        argp.add_argument(
+            'inputfile', type=str, metavar='FILE',
+            nargs='?' if serve_options.serve else None,
+            help='path to input image file, or "-" to read from stdin.',
+        )
     argp.add_argument(
         '-f', '--force', dest='output_overwrite', action='store_true',
         default=(
@@ -96,10 +233,40 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
         '-d', '--debug', action='store_true', dest='debug',
         help='preceed normal output with debug log printed to /dev/stderr.',
     )
+    if not batch:
+        argp_debug_group.add_argument(
+            '--timings', dest='timings', metavar='FORMAT', nargs='?',
+            choices=tuple(map(str, TimingsFormat)), const='table',
+            help=(
+                'print time spent in every stage of rendering to /dev/stderr, '
+                'as table or as json lines (one of '
+                f'{"|".join(map(str, TimingsFormat))}, default: %(const)s).'
+            ),
+        )
     argp.add_argument(
         '-y', '--crop-y', dest='crop_y', action='store_true',
         help='crop image to terminal height.',
     )
+    argp.add_argument(
+        '--trim', dest='trim', action='store_true',
+        help='leave out blank braille cells at the end of output rows.',
+    )
+    argp.add_argument(
+        '-C', '--color', dest='color', metavar='MODE', nargs='?',
+        choices=tuple(map(str, ColorMode)), const='256', default=None,
+        help=(
+            'color characters with the mean color of their cells, using '
+            f'{"|".join(map(str, ColorMode))} colors (%(const)s if omitted).'
+        ),
+    )
+    argp.add_argument(
+        '--palette', dest='palette', type=int, default=16, metavar='N',
+        choices=range(1, 257),
+        help=(
+            'number of distinct colors used with --color '
+            '(default: %(default)s).'
+        ),
+    )
     argp_scale_group = argp.add_argument_group(
         'resizing options'
     ).add_mutually_exclusive_group()
@@ -125,15 +292,56 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
             '(the more often the option gets repeated, the more).'
         ),
     )
+    argp_resample = argp.add_mutually_exclusive_group()
+    argp_resample.add_argument(
+        '-r', '--resample', dest='resample', metavar='FILTER',
+        choices=tuple(map(str, Resampling)), default='point',
+        help=(
+            'how to sample dots from the image: '
+            'point samples with bilinear interpolation, the other filters '
+            'scale the image down to the dot grid in one go '
+            f'(one of {"|".join(map(str, Resampling))}, '
+            'default: %(default)s).'
+        ),
+    )
+    argp_resample.add_argument(
+        '-A', '--aliasing', dest='resample', action='store_const',
+        const='nearest',
+        help='disable antialiasing (shortcut for -rnearest).',
+    )
     argp.add_argument(
-        '-A', '--aliasing', dest='disable_antialiasing', action='store_true',
-        help='disable antialiasing.',
+        '--full-res', dest='full_resolution', action='store_true',
+        help=(
+            'process the image at its full resolution instead of reducing '
+            'it to slightly above the resolution of the dot grid first.'
+        ),
     )
+    if not batch:
+        add_single_image_arguments(argp)
     argp.add_argument(
         '-b', '--brightness', dest='brightness', type=int,
         default=100, metavar='LEVEL', choices=range(1, 200),
         help='adjust brightness in percent (default: %(default)d).',
     )
+    argp.add_argument(
+        '-E', '--engine', dest='engine', metavar='ENGINE',
+        choices=tuple(map(str, Engine)), default='python',
+        help=(
+            'rasterization engine (one of '
+            f'{"|".join(map(str, Engine))}, default: %(default)s). '
+            'falls back to python if numpy is not installed. parallel '
+            'splits the image into bands rendered by worker processes.'
+        ),
+    )
+    if not batch:
+        argp.add_argument(
+            '-j', '--jobs', dest='jobs', type=int,
+            default=os.cpu_count() or 1, metavar='N',
+            help=(
+                'number of worker processes of the parallel engine '
+                '(default: %(default)s).'
+            ),
+        )
     argp_dither = argp.add_argument_group('dithering options')
     argp_dither.add_argument(
         '-e', '--dither', dest='error_preservation_factor', type=float,
@@ -144,10 +352,14 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
             'if omitted. (default: %(default)s).'
         ),
     )
+    argp_dither.add_argument(
+        '-S', '--serpentine', dest='serpentine', action='store_true',
+        help='scan every other dot row right to left while dithering.',
+    )
     argp_dither_method = argp_dither.add_mutually_exclusive_group()
     argp_dither_method.add_argument(
         '-D', '--dmethod', dest='dither_method', metavar='METH',
-        choices=('atkinson', 'floyd-steinberg'), default='atkinson',
+        choices=tuple(map(str, DitherMethod)), default='atkinson',
         help=(
             'dither method to use ('
             f'one of {"|".join(map(str, DitherMethod))}, '
@@ -164,7 +376,7 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
         'required if selected threshold mode is '
         f'{" or ".join(f'{mode!r}' for mode in thr_modes_requiring_args)}. '
     )
-    _, thr_arg_value_range, thr_arg_value_default = THRESHOLD_FUNC_FACTORIES[
+    thr_arg_value_range, thr_arg_value_default = THRESHOLD_MODES[
         thr_options.threshold_mode
     ]
     if thr_arg_value_range:
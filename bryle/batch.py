@@ -0,0 +1,198 @@
+import argparse
+import collections
+import concurrent.futures
+import glob
+import os
+import pathlib
+import sys
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, TextIO
+
+from . import terminal_rcwh
+from .args import parse_args
+from .img import plot_brightness_and_threshold
+from .pipeline import load_image_file, render
+from .sink import Sink
+from .util import Debug, Level
+
+
+@dataclass
+class Job:
+    index: int
+    inputfile: str
+    outputfile: pathlib.Path | None
+
+
+@dataclass
+class Result:
+    job: Job
+    lines: list[str] = field(default_factory=list)
+    log: list[str] = field(default_factory=list)
+    error: str | None = None
+
+
+def expand_inputs(
+    patterns: Iterable[str], stdin: TextIO = sys.stdin,
+) -> Iterator[str]:
+    '''
+    expand glob patterns, and read newline-separated paths from `stdin`
+    in place of "-" or if no patterns are given at all.
+
+    >>> list(expand_inputs(['eppels.*', 'shelly.jp?', 'no/such.jpg']))
+    ['eppels.png', 'shelly.jpg', 'no/such.jpg']
+    '''
+    for pattern in patterns or ['-']:
+        if pattern == '-':
+            yield from filter(None, map(str.strip, stdin))
+        elif glob.escape(pattern) == pattern:
+            yield pattern
+        else:
+            yield from sorted(glob.glob(pattern)) or [pattern]
+
+
+def output_path(template: str, index: int, inputfile: str) -> pathlib.Path:
+    '''
+    >>> output_path('out/{stem}.{index}.txt', 3, 'img/eppels.png')
+    PosixPath('out/eppels.3.txt')
+    '''
+    path = pathlib.Path(inputfile)
+    return pathlib.Path(template.format(
+        stem=path.stem, name=path.name, suffix=path.suffix,
+        parent=path.parent, index=index,
+    ))
+
+
+def write_output(
+    outputfile: pathlib.Path, lines: Iterable[str], trim: bool,
+) -> None:
+    '''
+    write one file's rendered lines to its output file like the single image
+    mode does.
+    '''
+    fd = os.open(outputfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        sink = Sink.to_fd(fd, trim=trim)
+        sink.frame(lines)
+        sink.close()
+    finally:
+        os.close(fd)
+
+
+def process(
+    job: Job, options: argparse.Namespace,
+    rcwh: tuple[int, int, int, int],
+) -> Result:
+    '''
+    render one input file. failures get reported in the result instead of
+    being raised, so that they don't abort the rest of the batch.
+    '''
+    result = Result(job)
+    with Debug.scope(enabled=options.debug) as log:
+        try:
+            if job.outputfile and not options.output_overwrite and (
+                job.outputfile.exists()
+            ):
+                raise FileExistsError(f'output file {job.outputfile} exists')
+            image = load_image_file(job.inputfile)
+            Debug.log('image dimensions: %d×%d', *image.size)
+            result.lines = list(
+                plot_brightness_and_threshold(
+                    image.convert('L'), options, charset='ascii',
+                ) if options.histogram
+                else render(image, options, rcwh_func=lambda: rcwh)
+            )
+            if job.outputfile:
+                write_output(job.outputfile, result.lines, options.trim)
+                result.lines = []
+        except Exception as e:
+            result.error = f'{type(e).__name__}: {e}'
+    result.log = log.lines() if log else []
+    return result
+
+
+def pool_results(
+    pending: collections.deque[Job], workers: int,
+    options: argparse.Namespace, rcwh: tuple[int, int, int, int],
+) -> Iterator[Result]:
+    '''
+    process `pending` jobs in a pool of worker processes and yield their
+    results in input order, taking jobs off `pending` as they are done.
+    stops early if a worker process dies, which breaks the whole pool.
+    '''
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(process, job, options, rcwh) for job in pending
+        ]
+        try:
+            for future in futures:
+                result = future.result()
+                pending.popleft()
+                yield result
+        except concurrent.futures.process.BrokenProcessPool as e:
+            Debug.log('worker process died: %s', e, level=Level.warning)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+def run(
+    jobs: list[Job], options: argparse.Namespace,
+    rcwh: tuple[int, int, int, int],
+) -> Iterator[Result]:
+    '''
+    process jobs in a pool of worker processes and yield their results in
+    input order, or process them right here if only one worker is wanted.
+    once a worker process dies, the first job that isn't done yet gets run
+    again on its own, and counts as failed if it takes that worker down as
+    well. the remaining jobs go on in a new pool.
+    '''
+    if options.jobs < 2:
+        yield from (process(job, options, rcwh) for job in jobs)
+        return
+    pending = collections.deque(jobs)
+    while pending:
+        yield from pool_results(pending, options.jobs, options, rcwh)
+        if not pending:
+            break
+        alone = collections.deque([pending.popleft()])
+        yield from pool_results(alone, 1, options, rcwh)
+        if alone:
+            yield Result(
+                alone[0], error='BrokenProcessPool: worker process died',
+            )
+
+
+def main(argv: list[str] = sys.argv[1:]) -> int:
+    options = parse_args(argv, batch=True)
+    template = (
+        None if options.outputfile == pathlib.Path('/dev/stdout')
+        else str(options.outputfile)
+    )
+    jobs = [
+        Job(
+            index, inputfile,
+            output_path(template, index, inputfile) if template else None,
+        )
+        for index, inputfile in enumerate(
+            expand_inputs(options.inputfiles, sys.stdin)
+        )
+    ]
+    rcwh = terminal_rcwh()
+    failures = 0
+    sys.stdout.flush()
+    sink = Sink(sys.stdout.buffer.write, sys.stdout.isatty(), trim=options.trim)
+    for result in run(jobs, options, rcwh):
+        for line in result.log:
+            Debug.log(line)
+        if result.error:
+            failures += 1
+            print(f'{result.job.inputfile}: {result.error}', file=sys.stderr)
+        sink.frame(result.lines)
+    sink.close()
+    Debug.log('rendered %d of %d files', len(jobs) - failures, len(jobs))
+    if options.debug:
+        Debug.show(sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+from typing import Callable, Iterable, Iterator
+
+from .util import Debug
+
+CACHE_FORMAT = 1
+ENTRY_SUFFIX = '.txt'
+
+# options which don't affect rendered output, and so are left out of keys
+IRRELEVANT_OPTIONS = frozenset((
+    'inputfile', 'outputfile', 'output_overwrite', 'debug', 'histogram',
+    'timings', 'engine', 'cache_dir', 'cache_size', 'cache_stats',
+    'watch', 'poll_interval', 'play', 'loops', 'redraw', 'trim', 'jobs',
+))
+
+
+def content_digest(path: pathlib.Path) -> bytes:
+    with path.open('rb') as f:
+        return hashlib.file_digest(f, 'blake2b').digest()
+
+
+def cache_key(
+    digest: bytes, options: argparse.Namespace,
+    rcwh: tuple[int, int, int, int],
+) -> str:
+    '''
+    hash of everything that rendered rows depend on: image contents, render
+    options and terminal geometry.
+
+    >>> options = argparse.Namespace(zoom_factor=2, debug=True)
+    >>> key = cache_key(b'fya', options, (44, 174, 1914, 1012))
+    >>> options.debug = False
+    >>> key == cache_key(b'fya', options, (44, 174, 1914, 1012))
+    True
+    >>> options.zoom_factor = 1
+    >>> key == cache_key(b'fya', options, (44, 174, 1914, 1012))
+    False
+    '''
+    settings = {
+        name: value for name, value in vars(options).items()
+        if name not in IRRELEVANT_OPTIONS
+    }
+    description = json.dumps(
+        [CACHE_FORMAT, settings, rcwh], sort_keys=True, default=str,
+    )
+    return hashlib.blake2b(
+        digest + description.encode(), digest_size=20,
+    ).hexdigest()
+
+
+class RenderCache:
+    '''
+    rendered rows stored in a directory, one file per key. entries get
+    written to a temporary file first and then renamed, so concurrent
+    processes never read partial entries. once the directory grows beyond
+    `max_bytes`, the least recently used entries get deleted.
+    '''
+    def __init__(self, directory: pathlib.Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.directory / f'{key}{ENTRY_SUFFIX}'
+
+    def get(self, key: str) -> list[str] | None:
+        try:
+            text = self.path(key).read_text(encoding='utf-8')
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            self.misses += 1
+            Debug.log('render cache miss: %s', key)
+            return None
+        self.hits += 1
+        Debug.log('render cache hit: %s', key)
+        return text.splitlines()
+
+    def put(self, key: str, lines: Iterable[str]) -> None:
+        import tempfile
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.writelines(f'{line}\n' for line in lines)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def entries(self) -> list[tuple[float, int, pathlib.Path]]:
+        '''
+        modification time, size and path of every entry, oldest first.
+        '''
+        entries = []
+        for path in self.directory.glob(f'*{ENTRY_SUFFIX}'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self) -> None:
+        entries = self.entries()
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+            Debug.log('render cache evicted: %s', path.stem)
+
+    def rows(
+        self, key: str, render: Callable[[], Iterable[str]],
+    ) -> Iterator[str]:
+        '''
+        yield cached rows, or rows from `render` which get stored once all
+        of them have been rendered.
+        '''
+        if (lines := self.get(key)) is not None:
+            yield from lines
+            return
+        lines = []
+        for line in render():
+            lines.append(line)
+            yield line
+        self.put(key, lines)
+
+    def stats(self) -> str:
+        entries = self.entries()
+        size = sum(entry[1] for entry in entries)
+        return (
+            f'render cache {self.directory}: {len(entries)} entries, '
+            f'{size / 2**20:.2f} of {self.max_bytes / 2**20:.2f} MiB used, '
+            f'{self.hits} hits, {self.misses} misses'
+        )
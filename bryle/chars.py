@@ -1,4 +1,4 @@
-from typing import Iterable, Literal
+from typing import Iterable, Literal, Sequence
 
 BRAILLE_DOT_MASK = [
     0x01, 0x08,
@@ -7,6 +7,19 @@ BRAILLE_DOT_MASK = [
     0x40, 0x80,
 ]
 
+BRAILLE_TABLE = str.maketrans(
+    ''.join(map(chr, range(256))),
+    ''.join(chr(0x2800 + code) for code in range(256)),
+)
+
+BRAILLE_ROW_BITS = [
+    (
+        BRAILLE_DOT_MASK[dy * 2].bit_length() - 1,
+        BRAILLE_DOT_MASK[dy * 2 + 1].bit_length() - 1,
+    )
+    for dy in range(4)
+]
+
 
 def braille(pixels: Iterable[bool | int], inverted: bool = False) -> str:
     '''
@@ -44,6 +57,41 @@ def braille(pixels: Iterable[bool | int], inverted: bool = False) -> str:
     return chr(codepoint)
 
 
+def braille_row(
+    dots: Sequence[bytes | bytearray], inverted: bool = False,
+) -> str:
+    '''
+    pack 4 rows of 0/1 dots into one line of braille characters.
+
+    every dot row is read as one big integer with a byte per dot, so that
+    shifting it places each dot at its bit position within the byte of its
+    braille cell.
+
+    >>> braille_row([
+    ...     bytes((1, 0, 0, 1)),
+    ...     bytes((0, 1, 0, 0)),
+    ...     bytes((1, 0, 0, 0)),
+    ...     bytes((0, 1, 1, 1)),
+    ... ])
+    '⢕⣈'
+
+    >>> braille_row([bytes((1, 0)), bytes((0, 1))] * 2, inverted=True)
+    '⡪'
+    '''
+    cells = len(dots[0]) // 2
+    codes = 0
+    for (left, right), row in zip(BRAILLE_ROW_BITS, dots, strict=True):
+        codes |= (
+            int.from_bytes(row[0::2], 'big') << left |
+            int.from_bytes(row[1::2], 'big') << right
+        )
+    if inverted:
+        codes ^= int.from_bytes(b'\xff' * cells, 'big')
+    return codes.to_bytes(cells, 'big').decode('latin-1').translate(
+        BRAILLE_TABLE
+    )
+
+
 def eighthblock(fraction: float) -> str:
     '''
     >>> eighthblock(0)
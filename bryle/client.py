@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import pathlib
+import socket
+import sys
+from dataclasses import dataclass
+from typing import Iterator
+
+from . import terminal_rcwh
+from .redraw import OUTPUT_STYLE, RESET_STYLE
+
+STATUS_MARKER = '\0'
+
+
+class RenderError(Exception):
+    ...
+
+
+@dataclass
+class Request:
+    '''
+    render request as sent to a `bra --serve` daemon: a json header line
+    followed by the image data, if the image isn't read from a file.
+
+    >>> request = Request(['-z2', '-'], (44, 80, 720, 836), '/tmp', b'fya')
+    >>> request.encode()[-29:]
+    b'"cwd": "/tmp", "size": 3}\\nfya'
+    >>> Request.read(io.BytesIO(request.encode())) == request
+    True
+    '''
+    argv: list[str]
+    rcwh: tuple[int, int, int, int]
+    cwd: str
+    data: bytes | None = None
+
+    def encode(self) -> bytes:
+        header = {
+            'argv': self.argv, 'rcwh': self.rcwh, 'cwd': self.cwd,
+            'size': len(self.data or b''),
+        }
+        return json.dumps(header).encode() + b'\n' + (self.data or b'')
+
+    @classmethod
+    def read(cls, f: io.BufferedIOBase) -> 'Request':
+        header = json.loads(f.readline())
+        return cls(
+            header['argv'], tuple(header['rcwh']), header['cwd'],
+            f.read(header['size']) if header['size'] else None,
+        )
+
+
+def request_lines(
+    socket_path: pathlib.Path | str, request: Request,
+) -> Iterator[str]:
+    '''
+    send render request to daemon and yield the lines it sends back.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(request.encode())
+        with sock.makefile('r', encoding='utf8') as f:
+            for line in f:
+                if not line.startswith(STATUS_MARKER):
+                    yield line.rstrip('\n')
+                    continue
+                status = json.loads(line[len(STATUS_MARKER):])
+                if status['error']:
+                    raise RenderError(status['error'])
+                return
+    raise RenderError('daemon closed connection before finishing render')
+
+
+def main(argv: list[str] = sys.argv[1:]) -> int:
+    if len(argv) < 2:
+        print('usage: bra-client SOCKET [OPTIONS] FILE', file=sys.stderr)
+        return 2
+    socket_path, *args = argv
+    request = Request(
+        args, terminal_rcwh(), os.getcwd(),
+        sys.stdin.buffer.read() if '-' in args else None,
+    )
+    style, reset = (OUTPUT_STYLE, RESET_STYLE) if sys.stdout.isatty() else (
+        '', ''
+    )
+    try:
+        for line in request_lines(socket_path, request):
+            print(f'{style}{line}{reset}')
+    except (OSError, RenderError) as e:
+        print(f'bra-client: {e}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import dataclasses
+import re
+from typing import Iterable, Iterator
+
+from PIL import Image
+
+from .args import ColorMode
+from .redraw import CSI, RESET_STYLE
+from .sink import BLANK
+from .util import Debug
+
+PALETTE_SIZE = 16
+
+# intensities of the 6×6×6 color cube of 256 color terminals
+CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+
+type RGB = tuple[int, int, int]
+
+
+def distance(a: RGB, b: RGB) -> int:
+    return sum((x - y) ** 2 for x, y in zip(a, b, strict=True))
+
+
+def xterm256(rgb: RGB) -> int:
+    '''
+    closest color of the 256 color palette, out of its color cube and its
+    gray ramp.
+
+    >>> xterm256((255, 0, 0)), xterm256((128, 128, 128)), xterm256((0, 90, 140))
+    (196, 244, 24)
+    '''
+    cube = [
+        min(range(6), key=lambda i: abs(CUBE_LEVELS[i] - value))
+        for value in rgb
+    ]
+    gray = max(0, min(23, round((sum(rgb) / 3 - 8) / 10)))
+    if distance((8 + 10 * gray,) * 3, rgb) < distance(
+        (CUBE_LEVELS[cube[0]], CUBE_LEVELS[cube[1]], CUBE_LEVELS[cube[2]]),
+        rgb,
+    ):
+        return 232 + gray
+    return 16 + 36 * cube[0] + 6 * cube[1] + cube[2]
+
+
+def sgr(rgb: RGB, mode: ColorMode) -> str:
+    '''
+    >>> sgr((0, 90, 140), ColorMode['256']), sgr((0, 90, 140), ColorMode.truecolor)
+    ('\\x1b[38;5;24m', '\\x1b[38;2;0;90;140m')
+    '''
+    if mode == ColorMode.truecolor:
+        return f'{CSI}38;2;{rgb[0]};{rgb[1]};{rgb[2]}m'
+    return f'{CSI}38;5;{xterm256(rgb)}m'
+
+
+def runs(line: str, indices: bytes) -> Iterator[tuple[int, int]]:
+    '''
+    start and palette index of runs of characters of the same color. blank
+    characters don't show any color, so they take on the color of the one
+    before them, or of the first one that isn't blank at the start of a line.
+
+    >>> list(runs('⣿⣿⠀⣿⣿⠀⣿', bytes((1, 1, 2, 1, 3, 3, 3))))
+    [(0, 1), (4, 3)]
+    >>> list(runs('⠀⣿', bytes((1, 2))))
+    [(0, 2)]
+    '''
+    if BLANK in line:
+        visible = [
+            index for char, index in zip(line, indices, strict=True)
+            if char != BLANK
+        ]
+        if not visible:
+            return
+        last = visible[0]
+        indices = bytes(
+            last := index if char != BLANK else last
+            for char, index in zip(line, indices, strict=True)
+        )
+    for run in re.finditer(rb'(.)\1*', indices, re.DOTALL):
+        yield run.start(), run[1][0]
+
+
+@dataclasses.dataclass
+class Colors:
+    '''
+    colors the characters of rendered lines with the mean color of their
+    cells, quantized to a small palette, with an escape sequence wherever
+    the color changes along a line. `image` is `scale` times the size of the
+    image that the lines get rasterized from.
+    '''
+    image: Image.Image
+    scale: int
+    mode: ColorMode
+    palette: int = PALETTE_SIZE
+
+    def cells(
+        self, sx: float, sy: float, cols: int, rows: int,
+    ) -> tuple[bytes, list[str]]:
+        '''
+        palette index of each character cell, and escape sequences setting
+        the colors of the palette.
+        '''
+        image = self.image
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        cells = image.resize(
+            (cols, rows), Image.Resampling.BOX,
+            box=(
+                0, 0,
+                min(image.width, cols * 2 * sx * self.scale),
+                min(image.height, rows * 4 * sy * self.scale),
+            ),
+        ).convert('RGB').quantize(
+            self.palette, method=Image.Quantize.MEDIANCUT,
+        )
+        palette = cells.getpalette() or []
+        colors = [
+            sgr((palette[i], palette[i + 1], palette[i + 2]), self.mode)
+            for i in range(0, len(palette), 3)
+        ]
+        Debug.log(
+            'color %d×%d cells with a palette of %d colors',
+            cols, rows, len(set(colors)),
+        )
+        # palette colors which come out the same make up a single run
+        same = bytes(colors.index(color) for color in colors)
+        return cells.tobytes().translate(same.ljust(256, b'\0')), colors
+
+    def apply(
+        self, lines: Iterable[str],
+        sx: float, sy: float, cols: int, rows: int,
+    ) -> Iterator[str]:
+        indices, colors = self.cells(sx, sy, cols, rows)
+        for y, line in enumerate(lines):
+            if not (chunks := list(
+                runs(line, indices[y * cols:(y + 1) * cols])
+            )):
+                yield line
+                continue
+            out = []
+            for (start, index), (end, _) in zip(
+                chunks, chunks[1:] + [(len(line), 0)], strict=True,
+            ):
+                out += [colors[index], line[start:end]]
+            yield ''.join(out) + RESET_STYLE
@@ -0,0 +1,355 @@
+import concurrent.futures
+import contextlib
+import dataclasses
+import itertools
+import multiprocessing
+import os
+import pickle
+from multiprocessing import shared_memory
+from multiprocessing.synchronize import Condition
+from typing import Iterable, Iterator, Sequence
+
+from . import pxp
+from .args import DitherMethod, Resampling
+from .img import ImgData, ThresholdFunc, ThresholdMap
+from .util import Debug
+
+# dots of a row that get dithered before its progress gets published
+WAVEFRONT_CHUNK = 32
+
+
+def picklable(threshold: ThresholdFunc) -> bool:
+    try:
+        pickle.dumps(threshold)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+@dataclasses.dataclass(frozen=True)
+class Setup:
+    '''
+    what worker processes need to know to render bands of the dot grid, and
+    where to find things in the shared memory block: the source plane, one
+    progress counter per dot row and, for dithering, one plane of diffused
+    error for each row offset of the dither kernel.
+    '''
+    name: str
+    # size of the source plane, which holds a value per dot if `sampled`
+    size: tuple[int, int]
+    sampled: bool
+    sx: float
+    sy: float
+    cols: int
+    rows: int
+    interpolate: bool
+    threshold: bytes
+    dither_method: DitherMethod
+    adjust_brightness: float
+    dither: float
+    inverted: bool
+    serpentine: bool
+
+    @property
+    def extent(self) -> tuple[int, int, int]:
+        span, pad = pxp.kernel_extent(self.dither_method)
+        return span, pad, self.cols + 2 * pad
+
+    @property
+    def progress_at(self) -> int:
+        return -(-self.size[0] * self.size[1] // 8) * 8
+
+    @property
+    def errors_at(self) -> int:
+        return self.progress_at + self.rows * 8
+
+    @property
+    def plane(self) -> int:
+        '''
+        number of error values in each plane, with rows to spare for the
+        kernel to reach below the grid.
+        '''
+        span, _, stride = self.extent
+        return (self.rows + span) * stride
+
+    @property
+    def diffused(self) -> bool:
+        '''
+        whether dots depend on those before them.
+        '''
+        return bool(self.dither) and (
+            self.dither_method not in pxp.THRESHOLD_MATRICES
+        )
+
+    @property
+    def bytes(self) -> int:
+        errors = self.extent[0] * self.plane if self.diffused else 0
+        return self.errors_at + errors * 8
+
+
+class Wavefront:
+    '''
+    error diffusion over a band of dot rows in chunks of `WAVEFRONT_CHUNK`
+    dots, with every row running a chunk behind the row above. a chunk gets
+    dithered as soon as the row above, which may belong to a band of another
+    worker process, has published progress past all dots that pass error on
+    to it. each row receives error in a plane per kernel row offset, which
+    only the one row above at that offset writes to, so that the sum and
+    thereby the output come out the same as for serial diffusion.
+
+    plain stores to shared memory may become visible to other processes out
+    of order on some CPUs, so progress only gets published and checked while
+    holding the lock of `changed`, which orders the error values written
+    before publishing ahead of any reads after checking. rows that aren't
+    ready wait on `changed` instead of spinning.
+    '''
+    def __init__(
+        self, setup: Setup, progress: memoryview, errors: memoryview,
+        changed: Condition,
+    ):
+        self.setup = setup
+        self.progress = progress
+        self.errors = errors
+        self.changed = changed
+        self.span, self.pad, self.stride = setup.extent
+        self.weights = pxp.kernel_weights(setup.dither_method, setup.dither)
+
+    def reversed(self, y: int) -> bool:
+        return self.setup.serpentine and y % 2 == 1
+
+    def scans(self, y: int) -> list[range]:
+        width = self.setup.cols
+        chunks = [
+            range(x, min(x + WAVEFRONT_CHUNK, width))
+            for x in range(0, width, WAVEFRONT_CHUNK)
+        ]
+        if not self.reversed(y):
+            return chunks
+        return [range(c.stop - 1, c.start - 1, -1) for c in chunks[::-1]]
+
+    def targets(self, y: int) -> list[tuple[int, int]]:
+        sign = -1 if self.reversed(y) else 1
+        return [
+            (
+                dy * self.setup.plane + (y + dy) * self.stride + self.pad +
+                sign * dx, f,
+            ) for (dx, dy, _), f in zip(
+                pxp.DITHER_ERROR_RECIPIENTS[self.setup.dither_method],
+                self.weights, strict=True,
+            )
+        ]
+
+    def ready(self, y: int, scan: range) -> bool:
+        '''
+        whether the row above is done with all dots diffusing error into
+        the dots of `scan`.
+        '''
+        if not y:
+            return True
+        done = self.progress[y - 1]
+        width = self.setup.cols
+        if self.reversed(y - 1):
+            return width - done <= max(0, min(scan) - self.pad)
+        return done >= min(width, max(scan) + 1 + self.pad)
+
+    def wait(self, rows: range, pending: dict[int, range]) -> list[int]:
+        '''
+        indices of the `pending` rows whose next chunk is ready, waiting for
+        rows above to make progress until there are any.
+        '''
+        with self.changed:
+            while not (ready := [
+                i for i, scan in pending.items() if self.ready(rows[i], scan)
+            ]):
+                self.changed.wait()
+        return ready
+
+    def publish(self, y: int, dots: int) -> None:
+        with self.changed:
+            self.progress[y] += dots
+            self.changed.notify_all()
+
+    def gather(self, y: int, scan: range) -> None:
+        '''
+        add up error from rows above in the row's own plane.
+        '''
+        errors = self.errors
+        offset = y * self.stride + self.pad
+        for dy in range(1, self.span):
+            above = dy * self.setup.plane + offset
+            for x in scan:
+                errors[offset + x] += errors[above + x]
+
+    def diffuse(
+        self, rows: range,
+        samples: Sequence[Sequence[int]], limits: Sequence[Sequence[float]],
+    ) -> list[bytearray]:
+        dots = [bytearray(self.setup.cols) for _ in rows]
+        scans = [iter(self.scans(y)) for y in rows]
+        targets = [self.targets(y) for y in rows]
+        pending = {i: next(scan) for i, scan in enumerate(scans)}
+        while pending:
+            for i in self.wait(rows, pending):
+                y, scan = rows[i], pending[i]
+                self.gather(y, scan)
+                pxp._diffuse_row(
+                    samples[i], limits[i], self.errors,
+                    y * self.stride + self.pad, targets[i], scan,
+                    self.setup.adjust_brightness, dots[i],
+                )
+                self.publish(y, len(scan))
+                if (chunk := next(scans[i], None)) is None:
+                    del pending[i]
+                else:
+                    pending[i] = chunk
+        return dots
+
+
+# set up in every worker process by `start_worker`
+WORKER: tuple[Setup, ThresholdMap, Condition] | None = None
+
+
+def start_worker(setup: Setup, changed: Condition) -> None:
+    global WORKER
+    WORKER = (setup, pickle.loads(setup.threshold), changed)
+
+
+def render_band(band: range) -> list[str]:
+    '''
+    render the character rows in `band` in a worker process.
+    '''
+    assert WORKER
+    setup, threshold, changed = WORKER
+    shm = shared_memory.SharedMemory(setup.name, track=False)
+    try:
+        assert shm.buf is not None
+        # views into shared memory need to be released before it gets closed
+        with contextlib.ExitStack() as views:
+            return list(pxp.characterize(
+                band_dots(
+                    setup, threshold, changed, shm.buf, views,
+                    range(band.start * 4, band.stop * 4),
+                ), setup.inverted,
+            ))
+    finally:
+        shm.close()
+
+
+def band_dots(
+    setup: Setup, threshold: ThresholdMap, changed: Condition,
+    buf: memoryview, views: contextlib.ExitStack, rows: range,
+) -> Iterable[bytes | bytearray]:
+    width, height = setup.size
+    source = views.enter_context(buf[:width * height].toreadonly())
+    samples: Iterable[Sequence[int]] = (
+        (
+            bytes(source[y * setup.cols:(y + 1) * setup.cols])
+            for y in rows
+        ) if setup.sampled else pxp.sample_rows(
+            ImgData.from_pixels(source, setup.size),
+            setup.sx, setup.sy, setup.cols, len(rows),
+            interpolate=setup.interpolate, top=rows.start,
+        )
+    )
+    xs = [setup.sx * x for x in range(setup.cols)]
+    ys = (setup.sy * y for y in rows)
+    if not setup.diffused:
+        return pxp.mono_rows(
+            samples, threshold, xs, ys,
+            top=rows.start,
+            dither_method=setup.dither_method,
+            adjust_brightness=setup.adjust_brightness,
+            dither=setup.dither,
+        )
+    progress = views.enter_context(
+        buf[setup.progress_at:setup.errors_at].cast('q')
+    )
+    wavefront = Wavefront(
+        setup, progress,
+        views.enter_context(buf[setup.errors_at:setup.bytes].cast('q')),
+        changed,
+    )
+    try:
+        return wavefront.diffuse(
+            rows, list(samples), list(threshold.rows(xs, ys)),
+        )
+    finally:
+        # rows below don't wait forever if this band fails
+        for y in rows:
+            wavefront.publish(y, setup.cols - progress[y])
+
+
+@contextlib.contextmanager
+def shared(setup: Setup, source: bytes | memoryview) -> Iterator[Setup]:
+    '''
+    block of shared memory laid out for `setup`, starting with `source`.
+    yields `setup` with the name of the block.
+    '''
+    shm = shared_memory.SharedMemory(create=True, size=setup.bytes)
+    try:
+        assert shm.buf is not None
+        shm.buf[:len(source)] = source
+        yield dataclasses.replace(setup, name=shm.name)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def rasterize(
+    imdat: ImgData,
+    sx: float, sy: float, max_col: int, max_row: int,
+    /, *,
+    interpolate: bool,
+    resample: Resampling,
+    threshold: ThresholdMap,
+    dither_method: DitherMethod,
+    adjust_brightness: float,
+    dither: float,
+    inverted: bool,
+    serpentine: bool = False,
+    workers: int | None = None,
+) -> Iterator[str]:
+    '''
+    render bands of character rows in worker processes, which share the
+    image and the diffused error in a block of shared memory. produces the
+    same output as the python engine.
+    '''
+    if not max_col or not max_row:
+        return
+    cols, rows = max_col * 2, max_row * 4
+    source, size = (imdat.pixels, (imdat.width, imdat.height)) if (
+        resample == Resampling.point
+    ) else (
+        memoryview(pxp.resample(imdat, sx, sy, cols, rows, resample)),
+        (cols, rows),
+    )
+    setup = Setup(
+        '', size, resample != Resampling.point, sx, sy, cols, rows,
+        interpolate, pickle.dumps(threshold), dither_method,
+        adjust_brightness, dither, inverted, serpentine,
+    )
+    workers = min(workers or os.cpu_count() or 1, max_row)
+    # bands of diffused rows need to be short to be worked on side by side
+    band = 1 if setup.diffused else -(-max_row // (workers * 4))
+    Debug.log(
+        'render %d character rows in bands of %d in %d worker processes',
+        max_row, band, workers,
+    )
+    context = multiprocessing.get_context()
+    with (
+        shared(setup, source) as setup,
+        concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=context, initializer=start_worker,
+            initargs=(setup, context.Condition()),
+        ) as executor,
+    ):
+        try:
+            yield from itertools.chain.from_iterable(executor.map(
+                render_band,
+                (
+                    range(top, min(top + band, max_row))
+                    for top in range(0, max_row, band)
+                ),
+            ))
+        finally:
+            executor.shutdown(cancel_futures=True)
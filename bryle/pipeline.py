@@ -0,0 +1,286 @@
+import argparse
+import io
+import os
+import pathlib
+import sys
+from typing import Callable, Iterable
+
+from PIL import Image
+
+from . import pxp, terminal_rcwh
+from .args import ColorMode, DitherMethod, Engine, Resampling
+from .chars import PairCharset
+from .color import PALETTE_SIZE, Colors
+from .img import (
+    ImgData,
+    ScaledThresholdMap,
+    ThresholdFunc,
+    get_threshold_func,
+    plot_brightness_and_threshold,
+    scaled_blur_radius,
+    sharpen,
+    thr_local_avg_factory,
+)
+from .timing import span
+from .util import Debug
+
+# entry in the info of decoded images that holds the size of the source image
+SOURCE_SIZE = 'bryle.source_size'
+
+
+def get_zoom_factor(
+    image: Image.Image, zoom_factor: float,
+    rcwh_func: Callable[
+        [], tuple[int, int, int, int]
+    ] = terminal_rcwh,
+) -> float:
+    if zoom_factor <= 0:
+        r, c, w, h = rcwh_func()
+        zoom_factor = w / image.width
+    Debug.log('resize image to %.1f%%', zoom_factor * 100)
+    return zoom_factor
+
+
+def load_image_file(filename: str) -> Image.Image:
+    '''
+    open image file without decoding it yet, so that `decode_image` can
+    still pick a reduced scale to decode it at.
+    '''
+    if filename != '-':
+        Debug.log('input file: %s', filename)
+        return Image.open(pathlib.Path(filename))
+    byteinput = sys.stdin.buffer.read()
+    try:
+        result = Image.open(
+            pathlib.Path(filename := byteinput.decode('utf8').strip())
+        )
+        Debug.log('input file: %s', filename)
+        return result
+    except Exception:
+        ...
+    return Image.open(io.BytesIO(byteinput))
+
+
+def decode_image(
+    image: Image.Image, zoom: float,
+    rcwh_func: Callable[
+        [], tuple[int, int, int, int]
+    ] = terminal_rcwh,
+    color: bool = False,
+) -> tuple[Image.Image, float]:
+    '''
+    decode image at the lowest resolution that still leaves enough pixels
+    for every dot, and return it together with the zoom factor adjusted to
+    its decoded size. JPEG images get scaled down while decoding, anything
+    else gets reduced right after, keeping its `color` if asked to. the size
+    of the source image stays in the info of the decoded one.
+    '''
+    scale = pxp.working_scale(*rcwh_func(), zoom)
+    if scale < 2:
+        return image, zoom
+    width, height = image.size
+    if image.format == 'JPEG':
+        image.draft(
+            image.mode, (-(-width // scale), -(-height // scale)),
+        )
+    if image.width == width:
+        image = reduce_image(image, scale, color=color)
+    image.info[SOURCE_SIZE] = (width, height)
+    Debug.log(
+        'decode image at scale 1/%d: %d×%d -> %d×%d',
+        round(width / image.width), width, height, *image.size,
+    )
+    return image, zoom * width / image.width
+
+
+def source_scale(image: Image.Image) -> float:
+    '''
+    factor by which `image` has been reduced from the source image while
+    decoding it.
+
+    >>> image = Image.new('L', (40, 30))
+    >>> source_scale(image)
+    1.0
+    >>> image.info[SOURCE_SIZE] = (100, 75)
+    >>> source_scale(image.reduce(2).convert('1'))
+    5.0
+    '''
+    width, _ = image.info.get(SOURCE_SIZE, image.size)
+    return float(width / image.width)
+
+
+def plot_image_histogram(
+    image: Image.Image, options: argparse.Namespace,
+    charset: PairCharset = 'blocks',
+) -> int:
+    if image.mode != 'L':
+        image = image.convert('L')
+    for line in plot_brightness_and_threshold(
+        image, options, charset=charset,
+    ):
+        print(line)
+    if options.debug:
+        Debug.show(sys.stderr)
+    return 0
+
+
+def reduce_image(
+    image: Image.Image, scale: int, color: bool = False,
+) -> Image.Image:
+    if scale < 2:
+        return image
+    if image.mode in ('1', 'P') or image.mode.startswith('I;'):
+        image = image.convert('RGB' if color and image.mode == 'P' else 'L')
+    Debug.log(
+        'reduce image by factor %d to working resolution %d×%d -> %d×%d',
+        scale, *image.size, *(-(-d // scale) for d in image.size),
+    )
+    return image.reduce(scale)
+
+
+def rasterize(
+    image: Image.Image,
+    zoom: float = 1,
+    inverted: bool = False,
+    crop_y: bool = False,
+    edging: int = 0,
+    dither: float = 0,
+    dither_method: DitherMethod = DitherMethod.atkinson,
+    serpentine: bool = False,
+    adjust_brightness: float = 1,
+    threshold_func: ThresholdFunc | None = None,
+    threshold_factory: Callable[
+        [Image.Image, float], ThresholdFunc
+    ] | None = None,
+    interpolate: bool = True,
+    resample: Resampling = Resampling.point,
+    engine: Engine = Engine.python,
+    workers: int | None = None,
+    color: ColorMode | None = None,
+    palette: int = PALETTE_SIZE,
+    full_resolution: bool = False,
+    rcwh_func: Callable[
+        [], tuple[int, int, int, int]
+    ] = terminal_rcwh,
+) -> Iterable[str]:
+    r, c, w, h = rcwh_func()
+    scale = 1 if full_resolution else pxp.working_scale(r, c, w, h, zoom)
+    # radii and threshold functions refer to pixels of the source image
+    source = scale * source_scale(image)
+    colors = Colors(image, scale, color, palette) if color else None
+    with span('reduce'):
+        image = reduce_image(image, scale)
+    with span('threshold'):
+        if threshold_factory:
+            threshold = threshold_factory(image, source)
+        elif threshold_func:
+            threshold = ScaledThresholdMap(threshold_func, source)
+        else:
+            threshold = thr_local_avg_factory(
+                image, scaled_blur_radius(image, 0, source),
+            )
+    with span('sharpen'):
+        image = sharpen(image, edging, w / c / 2 / source)
+    with span('convert'):
+        if image.mode != 'L':
+            image = image.convert('L')
+    yield from pxp.rasterize(
+        ImgData(image), r, c, w, h,
+        threshold=threshold,
+        zoom=zoom * scale,
+        interpolate=interpolate,
+        resample=resample,
+        crop_y=crop_y,
+        dither_method=dither_method,
+        adjust_brightness=adjust_brightness,
+        dither=dither,
+        serpentine=serpentine,
+        inverted=inverted,
+        engine=engine,
+        workers=workers,
+        colors=colors,
+    )
+
+
+def prepare_image(
+    image: Image.Image, options: argparse.Namespace,
+    rcwh_func: Callable[
+        [], tuple[int, int, int, int]
+    ] = terminal_rcwh,
+) -> tuple[Image.Image, float]:
+    '''
+    decode image as far as `options` require, and return it together with
+    the zoom factor to rasterize it at.
+    '''
+    zoom = get_zoom_factor(image, options.zoom_factor, rcwh_func=rcwh_func)
+    with span('decode'):
+        if not options.full_resolution:
+            image, zoom = decode_image(
+                image, zoom, rcwh_func=rcwh_func, color=bool(options.color),
+            )
+        image.load()
+    return image, zoom
+
+
+def render(
+    image: Image.Image, options: argparse.Namespace,
+    rcwh_func: Callable[
+        [], tuple[int, int, int, int]
+    ] = terminal_rcwh,
+    zoom: float | None = None,
+) -> Iterable[str]:
+    '''
+    rasterize loaded image with the settings in command line `options`.
+    an image which has been through `prepare_image` already gets passed
+    along with the `zoom` factor that came with it.
+    '''
+    if zoom is None:
+        image, zoom = prepare_image(image, options, rcwh_func=rcwh_func)
+    return rasterize(
+        image,
+        zoom=zoom,
+        inverted=options.invert,
+        resample=options.resample,
+        crop_y=options.crop_y,
+        edging=options.sharpen,
+        dither=options.error_preservation_factor,
+        dither_method=options.dither_method,
+        serpentine=options.serpentine,
+        threshold_factory=lambda image, scale: get_threshold_func(
+            image, options, scale=scale,
+        ),
+        adjust_brightness=options.brightness / 100,
+        engine=options.engine,
+        workers=options.jobs,
+        color=options.color,
+        palette=options.palette,
+        full_resolution=options.full_resolution,
+        rcwh_func=rcwh_func,
+    )
+
+
+def play_image(image: Image.Image, options: argparse.Namespace) -> int:
+    from .anim import play
+    with options.outputfile.open('w') as f:
+        result = play(image, options, f)
+    if options.debug:
+        Debug.show(sys.stderr)
+    return result
+
+
+def show_image(
+    options: argparse.Namespace,
+    load_image_file_func: Callable[[str], Image.Image] | None = None,
+) -> int:
+    '''
+    plot histogram of the input image or play its animation frames.
+    '''
+    with span('load'):
+        image = (load_image_file_func or load_image_file)(options.inputfile)
+    Debug.log('image dimensions: %d×%d', *image.size)
+    if options.histogram:
+        return plot_image_histogram(
+            image, options,
+            charset='blocks' if os.isatty(1) else 'ascii',
+        )
+    return play_image(image, options)
@@ -1,10 +1,18 @@
 import array
-from typing import Callable, Iterable
+import functools
+import importlib.util
+import math
+import random
+from typing import Callable, Iterable, Iterator, Sequence
 
-from .args import DitherMethod
-from .chars import braille
-from .img import ImgData, ThresholdFunc
-from .util import Debug
+from PIL import Image
+
+from .args import DitherMethod, Engine, Resampling
+from .chars import braille_row
+from .color import Colors
+from .img import ImgData, ThresholdFunc, ThresholdMap, as_threshold_map
+from .timing import timed
+from .util import Debug, Level
 
 
 def sample_func(
@@ -13,12 +21,12 @@ def sample_func(
     interpolate: bool = True,
 ) -> Callable[[int, int], int]:
 
-    pixels = array.array('B', img.pixels)  # type: ignore[type-var]
+    pixels = img.pixels
     width = img.width
 
     def getpixel(px: int, py: int) -> int:
-        pixelvalue = pixels[px + py * width]
-        return pixelvalue  # type: ignore[return-value]
+        pixelvalue: int = pixels[px + py * width]
+        return pixelvalue
 
     def getvalues(px: float, py: float) -> tuple[int, int, int, int]:
         x1, y1 = int(px), int(py)
@@ -51,6 +59,61 @@ def sample_func(
     return sample
 
 
+RESAMPLING_FILTERS = {
+    Resampling.nearest: Image.Resampling.NEAREST,
+    Resampling.bilinear: Image.Resampling.BILINEAR,
+    Resampling.box: Image.Resampling.BOX,
+    Resampling.lanczos: Image.Resampling.LANCZOS,
+}
+
+
+def resample(
+    img: ImgData,
+    sx: float, sy: float,
+    cols: int, rows: int,
+    method: Resampling,
+) -> bytes:
+    '''
+    scale the part of the image covered by a `cols`×`rows` dot grid down to
+    exactly one pixel per dot in one go.
+
+    >>> imdat = ImgData(Image.frombytes('L', (4, 2), bytes(range(0, 80, 10))))
+    >>> list(resample(imdat, 2, 2, 2, 1, Resampling.box))
+    [25, 45]
+    '''
+    if not cols or not rows:
+        return b''
+    Debug.log(
+        'resample image to %d×%d dots using %s filter', cols, rows, method,
+    )
+    return img.image.resize(
+        (cols, rows), RESAMPLING_FILTERS[method],
+        box=(0, 0, min(img.width, cols * sx), min(img.height, rows * sy)),
+        reducing_gap=None if method == Resampling.nearest else 2.,
+    ).tobytes()
+
+
+def sample_rows(
+    img: ImgData,
+    sx: float, sy: float,
+    cols: int, rows: int,
+    interpolate: bool = True,
+    method: Resampling = Resampling.point,
+    top: int = 0,
+) -> Iterator[Sequence[int]]:
+    '''
+    rows of dot values, starting at dot row `top` of the grid.
+    '''
+    if method != Resampling.point:
+        pixels = resample(img, sx, sy, cols, top + rows, method)
+        for y in range(top, top + rows):
+            yield pixels[y * cols:(y + 1) * cols]
+        return
+    sample = sample_func(img, sx, sy, interpolate=interpolate)
+    for y in range(top, top + rows):
+        yield [sample(x, y) for x in range(cols)]
+
+
 DITHER_ERROR_RECIPIENTS = {
     'atkinson': [
         (1, 0, 2), (2, 0, 2), (-1, 1, 2), (0, 1, 2), (1, 1, 2), (0, 2, 2),
@@ -61,6 +124,48 @@ DITHER_ERROR_RECIPIENTS = {
 }
 
 
+def layout(
+    imdat: ImgData,
+    r: int, c: int, w: int, h: int,
+    zoom: float, crop_y: bool,
+) -> tuple[float, float, int, int]:
+    cw, ch = w / c, h / r
+    sx, sy = cw / zoom / 2, ch / zoom / 4
+    Debug.log(
+        'xterm window dimensions: %d×%d pixels, %d×%d characters', w, h, c, r,
+    ).log(
+        'character size in pixels: %.2f×%.2f', cw, ch,
+    ).log(
+        'sample rate in pixels: %.2f horizontal, %.2f vertical', sx, sy,
+    )
+    max_row = round(imdat.height * zoom / ch) if not crop_y else min(
+        round(imdat.height * zoom / ch), r
+    )
+    max_col = min(round(imdat.width * zoom / cw), c)
+    Debug.log('using %d columns × %d rows', max_col, max_row)
+    return sx, sy, max_col, max_row
+
+
+WORKING_OVERSAMPLING = 3
+
+
+def working_scale(
+    r: int, c: int, w: int, h: int, zoom: float,
+) -> int:
+    '''
+    integer factor by which the image can be reduced before any processing
+    while still keeping `WORKING_OVERSAMPLING` pixels per dot.
+
+    >>> working_scale(44, 174, 1914, 1012, 1914 / 4000)
+    3
+
+    >>> working_scale(44, 174, 1914, 1012, 2)
+    1
+    '''
+    sx, sy = w / c / zoom / 2, h / r / zoom / 4
+    return max(1, int(min(sx, sy) / WORKING_OVERSAMPLING))
+
+
 def rasterize(
     imdat: ImgData,
     r: int, c: int, w: int, h: int,
@@ -72,75 +177,450 @@ def rasterize(
     adjust_brightness: float,
     dither: float,
     inverted: bool,
+    serpentine: bool = False,
+    resample: Resampling = Resampling.point,
+    engine: Engine = Engine.python,
+    workers: int | None = None,
+    colors: Colors | None = None,
 ) -> Iterable[str]:
+    sx, sy, max_col, max_row = layout(imdat, r, c, w, h, zoom, crop_y)
+    lines = render_lines(
+        imdat, sx, sy, max_col, max_row,
+        interpolate=interpolate,
+        threshold=threshold,
+        dither_method=dither_method,
+        adjust_brightness=adjust_brightness,
+        dither=dither,
+        inverted=inverted,
+        serpentine=serpentine,
+        resample=resample,
+        engine=engine,
+        workers=workers,
+    )
+    if colors:
+        lines = timed('color', colors.apply(lines, sx, sy, max_col, max_row))
+    yield from lines
 
-    error_recipients = DITHER_ERROR_RECIPIENTS[dither_method]
 
-    def dither_victims(x: int, y: int) -> Iterable[
-        tuple[int, int, int]
-    ]:
-        return [
-            (rx, ry, weight) for dx, dy, weight in error_recipients
-            if (
-                0 <= (rx := x + dx) < max_col * 2 and
-                (ry := y + dy) < max_row * 4
-            )
-        ]
-
-    cw, ch = w / c, h / r
-    sx, sy = cw / zoom / 2, ch / zoom / 4
-    Debug.log(
-        f'xterm window dimensions: {w}×{h} pixels, {c}×{r} characters'
-    ).log(
-        f'character size in pixels: {cw:.2f}×{ch:.2f}'
-    ).log(
-        f'sample rate in pixels: {sx:.2f} horizontal, {sy:.2f} vertical'
+def render_lines(
+    imdat: ImgData,
+    sx: float, sy: float, max_col: int, max_row: int,
+    /, *,
+    interpolate: bool,
+    threshold: ThresholdFunc,
+    dither_method: DitherMethod,
+    adjust_brightness: float,
+    dither: float,
+    inverted: bool,
+    serpentine: bool,
+    resample: Resampling,
+    engine: Engine,
+    workers: int | None,
+) -> Iterable[str]:
+    '''
+    lines of braille characters for a grid of `max_col`×`max_row` cells,
+    rendered by `engine`.
+    '''
+    if engine == Engine.parallel:
+        from . import par
+        if par.picklable(threshold):
+            yield from timed('parallel', par.rasterize(
+                imdat, sx, sy, max_col, max_row,
+                interpolate=interpolate,
+                resample=resample,
+                threshold=as_threshold_map(threshold),
+                dither_method=dither_method,
+                adjust_brightness=adjust_brightness,
+                dither=dither,
+                inverted=inverted,
+                serpentine=serpentine,
+                workers=workers,
+            ))
+            return
+        Debug.log(
+            'threshold function can\'t be sent to worker processes, '
+            'falling back to python engine',
+            level=Level.warning,
+        )
+    if engine == Engine.numpy:
+        if importlib.util.find_spec('numpy'):
+            from . import vec
+            yield from timed('vec', vec.rasterize(
+                imdat, sx, sy, max_col, max_row,
+                interpolate=interpolate,
+                resample=resample,
+                threshold=as_threshold_map(threshold),
+                dither_method=dither_method,
+                adjust_brightness=adjust_brightness,
+                dither=dither,
+                inverted=inverted,
+                serpentine=serpentine,
+            ))
+            return
+        Debug.log(
+            'numpy not available, falling back to python engine',
+            level=Level.warning,
+        )
+    samples = timed('sample', sample_rows(
+        imdat, sx, sy, max_col * 2, max_row * 4,
+        interpolate=interpolate, method=resample,
+    ))
+    mono = mono_rows(
+        samples, as_threshold_map(threshold),
+        [sx * x for x in range(max_col * 2)],
+        (sy * y for y in range(max_row * 4)),
+        dither_method=dither_method,
+        adjust_brightness=adjust_brightness,
+        dither=dither,
+        serpentine=serpentine,
     )
-    max_row = round(imdat.height * zoom / ch) if not crop_y else min(
-        round(imdat.height * zoom / ch), r
+    yield from timed('characterize', characterize(mono, inverted))
+
+
+def mono_rows(
+    samples: Iterable[Sequence[int]], thresholds: ThresholdMap,
+    xs: Sequence[float], ys: Iterable[float],
+    *,
+    top: int = 0,
+    dither_method: DitherMethod,
+    adjust_brightness: float,
+    dither: float,
+    serpentine: bool = False,
+) -> Iterable[bytes | bytearray]:
+    '''
+    turn rows of dot values sampled at `xs` and `ys` into rows of 0/1 dots
+    as `dither_method` says. `top` is the dot row of the first one.
+    '''
+    if dither and dither_method in THRESHOLD_MATRICES:
+        offsets = threshold_offsets(dither_method, dither)
+        if thresholds.scalar is not None:
+            return timed('order', ordered_monochrome(
+                samples, thresholds.scalar, adjust_brightness, offsets, top,
+            ))
+        return timed('order', ordered(
+            zip(
+                samples, timed('thresholds', thresholds.rows(xs, ys)),
+                strict=True,
+            ), len(xs), adjust_brightness, offsets, top,
+        ))
+    if thresholds.scalar is not None and not dither:
+        return timed('monochrome', monochrome(
+            samples, thresholds.scalar, adjust_brightness,
+        ))
+    return timed('dither', diffuse(
+        zip(
+            samples, timed('thresholds', thresholds.rows(xs, ys)),
+            strict=True,
+        ), len(xs),
+        dither_method=dither_method,
+        adjust_brightness=adjust_brightness,
+        dither=dither,
+        serpentine=serpentine,
+    ))
+
+
+def monochrome(
+    samples: Iterable[Sequence[int]], threshold: float,
+    adjust_brightness: float,
+) -> Iterator[bytes]:
+    '''
+    compare rows of dot values against one global threshold by translating
+    them through a table holding the outcome for every possible value.
+
+    >>> list(monochrome([[0, 100, 200], [150, 50, 255]], 127, 1.5))
+    [b'\\x00\\x01\\x01', b'\\x01\\x00\\x01']
+    '''
+    table = bytes(
+        value * adjust_brightness >= threshold for value in range(256)
     )
-    max_col = min(round(imdat.width * zoom / cw), c)
-    Debug.log(f'using {max_col} columns × {max_row} rows')
-    sample = sample_func(imdat, sx, sy, interpolate=interpolate)
-    grid: list[float] = [
-        sample(x, y)
-        for y in range(max_row * 4)
-        for x in range(max_col * 2)
+    for values in samples:
+        yield bytes(values).translate(table)
+
+
+@functools.cache
+def bayer_matrix(size: int) -> list[list[int]]:
+    '''
+    order in which the dots of a `size`×`size` tile get turned on, for a
+    power of 2 `size`, each at the spot furthest from those before it.
+
+    >>> bayer_matrix(2)
+    [[0, 2], [3, 1]]
+
+    >>> bayer_matrix(4)[:2]
+    [[0, 8, 2, 10], [12, 4, 14, 6]]
+    '''
+    if size < 2:
+        return [[0]]
+    half = size // 2
+    quarter = bayer_matrix(half)
+    return [
+        [
+            4 * quarter[y % half][x % half] + ((0, 2), (3, 1))[y // half][x // half]
+            for x in range(size)
+        ] for y in range(size)
     ]
-    mono = []
-    for y in range(max_row * 4):
-        for x in range(max_col * 2):
-            approx = (
-                value := grid[y * max_col * 2 + x]
-            ) * adjust_brightness >= threshold(
-                (sx * x, sy * y)
+
+
+BLUE_NOISE_SIZE = 16
+BLUE_NOISE_SIGMA = 1.5
+
+
+@functools.cache
+def blue_noise_matrix(size: int = BLUE_NOISE_SIZE) -> list[list[int]]:
+    '''
+    order in which the dots of a tile of blue noise get turned on, found
+    with the void-and-cluster method: every next dot goes to the spot with
+    the least of a gaussian energy of the dots there already, which wraps
+    around tile edges, so that tiles fit together without seams.
+
+    >>> ranks = blue_noise_matrix(8)
+    >>> sorted(rank for row in ranks for rank in row) == list(range(64))
+    True
+    '''
+    cells = size * size
+    kernel = [
+        [
+            math.exp(-(
+                min(x, size - x) ** 2 + min(y, size - y) ** 2
+            ) / (2 * BLUE_NOISE_SIGMA ** 2))
+            for x in range(size)
+        ] for y in range(size)
+    ]
+    energy = [0.] * cells
+
+    def toggle(cell: int, sign: int) -> None:
+        cx, cy = cell % size, cell // size
+        for y in range(size):
+            row = kernel[(y - cy) % size]
+            energy[y * size:(y + 1) * size] = [
+                e + sign * k for e, k in zip(
+                    energy[y * size:(y + 1) * size], row[-cx:] + row[:-cx],
+                    strict=True,
+                )
+            ]
+
+    dots = random.Random(size).sample(range(cells), cells // 10)
+    for cell in dots:
+        toggle(cell, 1)
+    # move dots out of the tightest cluster into the largest void until
+    # they are spread evenly
+    while True:
+        cluster = max(dots, key=energy.__getitem__)
+        toggle(cluster, -1)
+        dots.remove(cluster)
+        void = min(
+            (cell for cell in range(cells) if cell not in dots),
+            key=energy.__getitem__,
+        )
+        toggle(void, 1)
+        dots.append(void)
+        if void == cluster:
+            break
+    ranks = [0] * cells
+    initial, spread = list(dots), list(energy)
+    for rank in range(len(dots) - 1, -1, -1):
+        cluster = max(dots, key=energy.__getitem__)
+        toggle(cluster, -1)
+        dots.remove(cluster)
+        ranks[cluster] = rank
+    dots, energy[:] = initial, spread
+    free = set(range(cells)) - set(dots)
+    for rank in range(len(dots), cells):
+        void = min(free, key=energy.__getitem__)
+        toggle(void, 1)
+        free.remove(void)
+        ranks[void] = rank
+    return [ranks[y * size:(y + 1) * size] for y in range(size)]
+
+
+# ordered dither methods and the tiles of thresholds they compare dots with
+THRESHOLD_MATRICES: dict[str, Callable[[], list[list[int]]]] = {
+    'bayer2': functools.partial(bayer_matrix, 2),
+    'bayer4': functools.partial(bayer_matrix, 4),
+    'bayer8': functools.partial(bayer_matrix, 8),
+    'blue-noise': blue_noise_matrix,
+}
+
+
+def threshold_offsets(
+    dither_method: DitherMethod, dither: float,
+) -> list[list[float]]:
+    '''
+    amounts by which an ordered dither method moves the threshold of the
+    dots in a tile, up to half the brightness range either way.
+
+    >>> threshold_offsets(DitherMethod.bayer2, 1)
+    [[-95.625, 31.875], [95.625, -31.875]]
+    '''
+    ranks = THRESHOLD_MATRICES[dither_method]()
+    cells = len(ranks) ** 2
+    return [
+        [dither * 255 * ((rank + .5) / cells - .5) for rank in row]
+        for row in ranks
+    ]
+
+
+def ordered(
+    rows: Iterable[tuple[Sequence[int], Sequence[float]]],
+    width: int, adjust_brightness: float,
+    offsets: list[list[float]], top: int = 0,
+) -> Iterator[bytearray]:
+    '''
+    compare every dot with its threshold moved by the offset at its spot in
+    the tile. unlike with error diffusion, dots don't depend on each other.
+
+    >>> rows = ordered([([100] * 4, [127] * 4)] * 2, 4, 1, [[-30, 0], [30, 60]])
+    >>> [list(row) for row in rows]
+    [[1, 0, 1, 0], [0, 0, 0, 0]]
+    '''
+    tiled = [(row * -(-width // len(row)))[:width] for row in offsets]
+    for y, (values, limits) in enumerate(rows, top):
+        yield bytearray(
+            value * adjust_brightness >= limit + offset
+            for value, limit, offset in zip(
+                values, limits, tiled[y % len(tiled)], strict=True,
+            )
+        )
+
+
+def ordered_monochrome(
+    samples: Iterable[Sequence[int]], threshold: float,
+    adjust_brightness: float, offsets: list[list[float]], top: int = 0,
+) -> Iterator[bytearray]:
+    '''
+    like `ordered`, for one global threshold: every column of a tile gets
+    its dots translated through a table of outcomes at once.
+
+    >>> rows = ordered_monochrome(
+    ...     [[100] * 4] * 2, 127, 1, [[-30, 0], [30, 60]], top=1,
+    ... )
+    >>> [list(row) for row in rows]
+    [[0, 0, 0, 0], [1, 0, 1, 0]]
+    '''
+    tables = [
+        [
+            bytes(
+                value * adjust_brightness >= threshold + offset
+                for value in range(256)
+            ) for offset in row
+        ] for row in offsets
+    ]
+    for y, values in enumerate(samples, top):
+        dots = bytes(values)
+        row = bytearray(len(dots))
+        n = len(tables[y % len(tables)])
+        for x, table in enumerate(tables[y % len(tables)]):
+            row[x::n] = dots[x::n].translate(table)
+        yield row
+
+
+FIXED_POINT_SHIFT = 12
+
+
+def diffuse(
+    rows: Iterable[tuple[Sequence[int], Sequence[float]]],
+    width: int,
+    *,
+    dither_method: DitherMethod,
+    adjust_brightness: float,
+    dither: float,
+    serpentine: bool = False,
+) -> Iterator[bytearray]:
+    '''
+    turn rows of sampled dot values and their thresholds into rows of 0/1
+    dots, diffusing the quantization error of each dot over its not yet
+    visited neighbours if `dither` is set. rows are consumed and yielded one
+    at a time.
+
+    error is kept in fixed point integers in a ring buffer that only spans
+    as many dot rows as the dither kernel reaches down, with enough padding
+    on either side for the kernel to never need a bounds check.
+
+    >>> rows = diffuse(
+    ...     [([100] * 6, [127] * 6)] * 2, 6,
+    ...     dither_method='atkinson', adjust_brightness=1, dither=1,
+    ... )
+    >>> [list(row) for row in rows]
+    [[0, 0, 0, 1, 0, 0], [0, 1, 0, 0, 1, 0]]
+    '''
+    if not dither:
+        for values, limits in rows:
+            yield bytearray(
+                value * adjust_brightness >= limit
+                for value, limit in zip(values, limits, strict=True)
             )
-            mono.append(approx)
-            error = (value - (255 * approx)) * dither / 16
-            for dx, dy, weight in dither_victims(x, y):
-                grid[dy * max_col * 2 + dx] += error * weight
-    yield from characterize(
-        mono, max_col, max_row, inverted,
+        return
+    recipients = DITHER_ERROR_RECIPIENTS[dither_method]
+    span, pad = kernel_extent(dither_method)
+    stride = width + 2 * pad
+    errors = array.array('l', [0]) * (span * stride)
+    blank = array.array('l', [0]) * stride
+    weights = kernel_weights(dither_method, dither)
+    for y, (values, limits) in enumerate(rows):
+        reverse = serpentine and y % 2 == 1
+        targets = [
+            (((y + dy) % span) * stride + pad + (-dx if reverse else dx), f)
+            for (dx, dy, _), f in zip(recipients, weights, strict=True)
+        ]
+        offset = (y % span) * stride
+        yield _diffuse_row(
+            values, limits, errors, offset + pad, targets,
+            range(width - 1, -1, -1) if reverse else range(width),
+            adjust_brightness, bytearray(width),
+        )
+        errors[offset:offset + stride] = blank
+
+
+def kernel_extent(dither_method: DitherMethod) -> tuple[int, int]:
+    '''
+    number of dot rows the error of a dot gets spread over, including its
+    own, and how far it reaches sideways.
+
+    >>> kernel_extent(DitherMethod.atkinson)
+    (3, 2)
+    '''
+    recipients = DITHER_ERROR_RECIPIENTS[dither_method]
+    return (
+        max(dy for _, dy, _ in recipients) + 1,
+        max(abs(dx) for dx, _, _ in recipients),
     )
 
 
+def kernel_weights(dither_method: DitherMethod, dither: float) -> list[int]:
+    return [
+        round(dither * weight / 16 * (1 << FIXED_POINT_SHIFT))
+        for _, _, weight in DITHER_ERROR_RECIPIENTS[dither_method]
+    ]
+
+
+def _diffuse_row(
+    values: Sequence[int], limits: Sequence[float],
+    errors: array.array[int] | memoryview, offset: int,
+    targets: list[tuple[int, int]], scan: range,
+    adjust_brightness: float, row: bytearray,
+) -> bytearray:
+    '''
+    dither the dots of `row` in `scan` order, which may be just a part of it.
+    '''
+    shift = FIXED_POINT_SHIFT
+    full = 255 << shift
+    for x in scan:
+        value = errors[offset + x] + (values[x] << shift)
+        if value * adjust_brightness >= limits[x] * (1 << shift):
+            row[x] = 1
+            value -= full
+        if value:
+            for target, factor in targets:
+                errors[target + x] += value * factor >> shift
+    return row
+
+
 def characterize(
-    mono: list[bool], max_col: int, max_row: int, inverted: bool,
-) -> Iterable[str]:
-    row: list[str] = []
-    for cy in range(max_row):
-        for cx in range(max_col):
-            registers = [
-                mono[
-                    max_col * 2 * (cy * 4 + dy) + cx * 2 + dx
-                ]
-                for dx, dy in (
-                    (0, 0), (1, 0),
-                    (0, 1), (1, 1),
-                    (0, 2), (1, 2),
-                    (0, 3), (1, 3),
-                )
-            ]
-            row.append(braille(registers, inverted=inverted))
-        yield ''.join(row)
-        row.clear()
+    mono: Iterable[bytes | bytearray], inverted: bool,
+) -> Iterator[str]:
+    band: list[bytes | bytearray] = []
+    for row in mono:
+        band.append(row)
+        if len(band) == 4:
+            yield braille_row(band, inverted=inverted)
+            band.clear()
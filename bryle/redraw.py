@@ -0,0 +1,126 @@
+from typing import Iterator, Sequence
+
+CSI = '\033['
+OUTPUT_STYLE = f'{CSI}38;5;231m'
+RESET_STYLE = f'{CSI}0m'
+
+
+def cursor_to_column(col: int) -> str:
+    return f'{CSI}{col + 1}G'
+
+
+def cursor_vertical(rows: int) -> str:
+    '''
+    >>> cursor_vertical(-2), cursor_vertical(3), cursor_vertical(0)
+    ('\\x1b[2A', '\\x1b[3B', '')
+    '''
+    if not rows:
+        return ''
+    return f'{CSI}{abs(rows)}{"A" if rows < 0 else "B"}'
+
+
+def changed_runs(old: str, new: str) -> Iterator[tuple[int, str]]:
+    '''
+    find runs of changed characters in a line of equal length. runs get merged
+    if rewriting the unchanged characters between them takes fewer bytes than
+    moving the cursor past them.
+
+    >>> list(changed_runs('abcdefghij', 'aXcdefghiY'))
+    [(1, 'X'), (9, 'Y')]
+
+    >>> list(changed_runs('⠁⠁⠁⠁⠁⠁', '⠂⠁⠂⠁⠁⠂'))
+    [(0, '⠂⠁⠂'), (5, '⠂')]
+    '''
+    start = end = -1
+    for col, (a, b) in enumerate(zip(old, new, strict=True)):
+        if a == b:
+            continue
+        if start > -1 and len(new[end:col].encode()) > len(
+            cursor_to_column(col)
+        ):
+            yield start, new[start:end]
+            start = -1
+        if start < 0:
+            start = col
+        end = col + 1
+    if start > -1:
+        yield start, new[start:end]
+
+
+class Screen:
+    '''
+    keeps the lines written to the terminal last, so that only the cells
+    which differ in the next frame need to be rewritten. the cursor is
+    expected to rest at the start of the line below the last frame. frames
+    that don't fit into a terminal of `rows` lines can't be reached by
+    moving the cursor up, so the next frame gets printed below them.
+
+    >>> screen = Screen()
+    >>> screen.update(['⠁⠂⠃', '⠄⠅⠆'])
+    '⠁⠂⠃\\n⠄⠅⠆\\n'
+    >>> screen.update(['⠁⠂⠃', '⠄⣿⠆'])
+    '\\x1b[1A\\x1b[2G⣿\\x1b[1B\\r'
+    >>> screen.update(['⠁⠂⠃', '⠄⣿⠆'])
+    ''
+    '''
+    def __init__(self, style: str = '', rows: int | None = None):
+        self.style = style
+        self.rows = rows
+        self.lines: list[str] = []
+
+    @property
+    def reachable(self) -> bool:
+        '''
+        whether the cursor can move up to the first line of the last frame.
+
+        >>> screen = Screen(rows=3)
+        >>> screen.lines = ['⠁', '⠂']
+        >>> screen.reachable
+        True
+        >>> screen.lines.append('⠃')
+        >>> screen.reachable, screen.update(['⠄'] * 3)
+        (False, '⠄\\n⠄\\n⠄\\n')
+        '''
+        return self.rows is None or len(self.lines) < self.rows
+
+    def redraw(self, lines: Sequence[str], clear: bool = True) -> str:
+        if not self.lines or not self.reachable:
+            return ''.join(f'{line}\n' for line in lines)
+        eol = f'{CSI}K' if clear else ''
+        return (
+            f'{cursor_vertical(-len(self.lines))}\r'
+            + ''.join(f'{line}{eol}\n' for line in lines)
+            + (f'{CSI}J' if clear else '')
+        )
+
+    def diff(self, lines: Sequence[str]) -> str:
+        out = []
+        row = len(self.lines)
+        for target, (old, new) in enumerate(zip(self.lines, lines, strict=True)):
+            for col, run in changed_runs(old, new):
+                out += [cursor_vertical(target - row), cursor_to_column(col), run]
+                row = target
+        if out:
+            out.append(f'{cursor_vertical(len(lines) - row)}\r')
+        return ''.join(out)
+
+    def update(self, lines: Sequence[str], diff: bool = True) -> str:
+        '''
+        returns what needs to be written to turn the previous frame into the
+        new one. the whole frame gets redrawn if its shape has changed, or if
+        that takes fewer bytes than moving the cursor to every change.
+        '''
+        same_shape = len(lines) == len(self.lines) and all(
+            len(a) == len(b) for a, b in zip(lines, self.lines, strict=True)
+        )
+        if diff and same_shape and self.reachable:
+            out = min(
+                self.diff(lines), self.redraw(lines, clear=False),
+                key=lambda out: len(out.encode()),
+            )
+        else:
+            out = self.redraw(lines)
+        self.lines = list(lines)
+        if out and self.style:
+            return f'{self.style}{out}{RESET_STYLE}'
+        return out
@@ -0,0 +1,180 @@
+import argparse
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import pathlib
+import socket
+import socketserver
+import sys
+import threading
+from typing import Any, Callable, Hashable, Iterator
+
+from PIL import Image
+
+from .args import parse_args
+from .client import STATUS_MARKER, Request
+from .img import plot_brightness_and_threshold
+from .pipeline import load_image_file, prepare_image, render
+from .util import Debug
+
+ARGS_LOCK = threading.Lock()
+
+
+class LRU[K: Hashable, V]:
+    '''
+    mapping of at most `size` entries, dropping the least recently used.
+
+    >>> lru = LRU[str, int](2)
+    >>> lru.get('a', lambda: 1), lru.get('b', lambda: 2), lru.get('a', list)
+    (1, 2, 1)
+    >>> lru.get('c', lambda: 3), list(lru.entries), (lru.hits, lru.misses)
+    (3, ['a', 'c'], (1, 3))
+    '''
+    def __init__(self, size: int):
+        self.size = size
+        self.entries: collections.OrderedDict[K, V] = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: K, load: Callable[[], V]) -> V:
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+        value = load()
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return value
+
+
+def parse_request_args(argv: list[str]) -> argparse.Namespace:
+    '''
+    parse arguments of a render request, turning argparse's complaints into
+    exceptions instead of letting them end the daemon.
+    '''
+    with (
+        ARGS_LOCK,
+        contextlib.redirect_stderr(io.StringIO()) as err,
+        contextlib.redirect_stdout(err),
+    ):
+        try:
+            return parse_args(argv)
+        except SystemExit:
+            messages = err.getvalue().strip().splitlines() or ['']
+            raise ValueError(f'invalid arguments: {messages[-1]}') from None
+
+
+class RenderServer(socketserver.ThreadingUnixStreamServer):
+    '''
+    render daemon keeping decoded images of recent requests in memory, and
+    running at most `max_renders` renders at once.
+    '''
+    daemon_threads = True
+
+    def __init__(self, path: pathlib.Path, max_renders: int, images: int):
+        self.renders = threading.BoundedSemaphore(max_renders)
+        self.images = LRU[Hashable, tuple[Image.Image, float]](images)
+        super().__init__(str(path), RenderHandler)
+
+    def image(
+        self, request: Request, options: argparse.Namespace,
+    ) -> tuple[Image.Image, float]:
+        if request.data is not None:
+            identity: Any = hashlib.blake2b(request.data).digest()
+        else:
+            path = pathlib.Path(request.cwd) / options.inputfile
+            stat = path.stat()
+            identity = (str(path), stat.st_mtime_ns, stat.st_size)
+
+        def load() -> tuple[Image.Image, float]:
+            image = (
+                Image.open(io.BytesIO(request.data))
+                if request.data is not None else load_image_file(str(path))
+            )
+            image, zoom = prepare_image(
+                image, options, rcwh_func=lambda: request.rcwh,
+            )
+            image.load()
+            return image, zoom
+
+        return self.images.get(
+            (
+                identity, options.zoom_factor, options.full_resolution,
+                request.rcwh, bool(options.color),
+            ),
+            load,
+        )
+
+    def render(self, request: Request) -> Iterator[str]:
+        '''
+        lines rendered for `request` as they come, which count as one of
+        the renders running at once until the last one has been taken.
+        '''
+        options = parse_request_args(request.argv)
+        with self.renders:
+            image, zoom = self.image(request, options)
+            if options.histogram:
+                yield from plot_brightness_and_threshold(
+                    image.convert('L'), options, charset='ascii',
+                )
+                return
+            yield from render(
+                image, options, rcwh_func=lambda: request.rcwh, zoom=zoom,
+            )
+
+
+class RenderHandler(socketserver.StreamRequestHandler):
+    server: RenderServer
+
+    def handle(self) -> None:
+        error = None
+        try:
+            with Debug.scope(enabled=False):
+                for line in self.server.render(Request.read(self.rfile)):
+                    self.wfile.write(f'{line}\n'.encode())
+                    self.wfile.flush()
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        # clients which went away don't get to know how it ended
+        with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+            self.wfile.write(
+                f'{STATUS_MARKER}{json.dumps({"error": error})}\n'.encode()
+            )
+
+
+def listening(path: pathlib.Path) -> bool:
+    '''
+    whether a daemon still answers on the socket at `path`.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path))
+        except OSError:
+            return False
+    return True
+
+
+def serve(options: argparse.Namespace) -> int:
+    path: pathlib.Path = options.serve
+    if path.is_socket():
+        if listening(path):
+            print(
+                f'a daemon is already listening on {path}!', file=sys.stderr,
+            )
+            return 1
+        path.unlink()
+    with (
+        RenderServer(path, options.max_renders, options.image_cache) as server,
+        contextlib.suppress(KeyboardInterrupt),
+    ):
+        try:
+            server.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+    return 0
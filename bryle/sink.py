@@ -0,0 +1,105 @@
+import os
+import stat
+from typing import Callable, Iterable
+
+from .redraw import OUTPUT_STYLE, RESET_STYLE
+from .timing import span
+from .util import Debug
+
+BLANK = '\u2800'
+BUFFER_SIZE = 1 << 16
+
+type Write = Callable[[memoryview], int | None]
+
+
+class Sink:
+    '''
+    collects rendered rows utf-8 encoded in one preallocated buffer, which
+    only gets written once it is full or the sink gets closed, or after
+    every row if `line_buffered`, so that terminals and pipes get to show
+    rows as soon as they are rendered. on a terminal, the output style gets
+    set once per frame instead of for every row. with `trim`, blank braille
+    cells get cut off the end of rows.
+
+    >>> out = bytearray()
+    >>> sink = Sink(lambda data: out.extend(data), tty=True, trim=True)
+    >>> sink.frame(['⣿⠀⠀', '⠀⠀⠀'])
+    >>> sink.close()
+    >>> out.decode(), (sink.bytes, sink.calls)
+    ('\\x1b[38;5;231m⣿\\n\\n\\x1b[0m', (20, 1))
+    '''
+    def __init__(
+        self, write: Write, tty: bool, trim: bool = False,
+        size: int = BUFFER_SIZE, line_buffered: bool = False,
+    ):
+        self.write = write
+        self.tty = tty
+        self.trim = trim
+        self.line_buffered = line_buffered
+        self.buffer = bytearray(size)
+        self.length = 0
+        self.bytes = self.calls = 0
+
+    @classmethod
+    def to_fd(cls, fd: int, trim: bool = False) -> 'Sink':
+        '''
+        sink writing to `fd`, which only buffers whole frames for regular
+        files.
+        '''
+        return cls(
+            lambda data: os.write(fd, data), os.isatty(fd), trim=trim,
+            line_buffered=not stat.S_ISREG(os.fstat(fd).st_mode),
+        )
+
+    def put(self, data: bytes) -> None:
+        end = self.length + len(data)
+        if end > len(self.buffer):
+            self.flush()
+            if len(data) > len(self.buffer):
+                self.send(memoryview(data))
+                return
+            end = len(data)
+        self.buffer[self.length:end] = data
+        self.length = end
+
+    def row(self, row: str) -> None:
+        if self.trim:
+            # colored rows end in a reset, which stays
+            text = row.removesuffix(RESET_STYLE)
+            row = text.rstrip(BLANK) + row[len(text):]
+        self.put(row.encode())
+        self.put(b'\n')
+
+    def frame(self, rows: Iterable[str]) -> None:
+        if self.tty:
+            self.put(OUTPUT_STYLE.encode())
+        for row in rows:
+            with span('output'):
+                self.row(row)
+                if self.line_buffered:
+                    self.drain()
+        if self.tty:
+            self.put(RESET_STYLE.encode())
+
+    def send(self, data: memoryview) -> None:
+        '''
+        write all of `data`, even if that takes more than one call.
+        '''
+        while data:
+            written = self.write(data)
+            self.calls += 1
+            written = len(data) if written is None else written
+            self.bytes += written
+            data = data[written:]
+
+    def drain(self) -> None:
+        self.send(memoryview(self.buffer)[:self.length])
+        self.length = 0
+
+    def flush(self) -> None:
+        with span('output'):
+            self.drain()
+
+    def close(self) -> None:
+        self.flush()
+        Debug.log('wrote %d bytes in %d write calls', self.bytes, self.calls)
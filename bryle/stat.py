@@ -1,8 +1,130 @@
-from typing import Iterable, Literal
+import bisect
+import functools
+import itertools
+from typing import Iterable, Literal, Mapping
 
 from .chars import PairCharset, pair2char
 
 
+class Histogram:
+    '''
+    frequencies of the values `0..len(counts) - 1`. their running totals get
+    summed up once, so that quantiles can be looked up by bisection instead
+    of scanning the bins on every query.
+
+    >>> h = Histogram([0, 3, 2, 1])
+    >>> h.total, h.percentile(50), h.percentile(66), h.extrema, h.mean
+    (6, 1, 2, (1, 3), 1)
+
+    >>> (h + Histogram([0, 0, 0, 5, 1])).counts
+    [0, 3, 2, 6, 1]
+    '''
+    def __init__(self, counts: Iterable[int]):
+        self.counts = list(counts)
+        self.cumulative = list(itertools.accumulate(self.counts))
+
+    @classmethod
+    def of(cls, histogram: 'Iterable[int] | Histogram') -> 'Histogram':
+        if isinstance(histogram, Histogram):
+            return histogram
+        return cls(histogram)
+
+    @classmethod
+    def from_frequencies(
+        cls, frequencies: Mapping[float, int], scale: float = 1,
+        bins: int = 256,
+    ) -> 'Histogram':
+        '''
+        bin how often each value occurs after scaling it. values that don't
+        fit any bin get left out.
+
+        >>> Histogram.from_frequencies({1: 2, 1.2: 1, 2.5: 4, 3: 1}, bins=3).counts
+        [0, 3, 4]
+        '''
+        counts = [0] * bins
+        for value, count in frequencies.items():
+            if 0 <= (i := round(value * scale)) < bins:
+                counts[i] += count
+        return cls(counts)
+
+    @classmethod
+    def merge(cls, histograms: Iterable['Histogram']) -> 'Histogram':
+        '''
+        sum up the histograms of e.g. several tiles or frames.
+
+        >>> Histogram.merge(Histogram([i, 1, 0]) for i in range(3)).counts
+        [3, 3, 0]
+        '''
+        return cls(
+            sum(bins) for bins in itertools.zip_longest(
+                *(h.counts for h in histograms), fillvalue=0,
+            )
+        )
+
+    def __add__(self, other: 'Histogram') -> 'Histogram':
+        return Histogram.merge((self, other))
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    @property
+    def total(self) -> int:
+        return self.cumulative[-1] if self.cumulative else 0
+
+    def quantile(self, q: float) -> int:
+        '''
+        lowest value for which at least a `q` fraction of all values are
+        less or equal.
+        '''
+        return bisect.bisect_left(self.cumulative, self.total * q)
+
+    def percentile(self, percent: float = 50) -> int:
+        return self.quantile(percent / 100)
+
+    @functools.cached_property
+    def extrema(self) -> tuple[int, int]:
+        if not self.total:
+            return (len(self) - 1,) * 2
+        return (
+            bisect.bisect_right(self.cumulative, 0),
+            bisect.bisect_left(self.cumulative, self.total),
+        )
+
+    @functools.cached_property
+    def mean(self) -> int:
+        # every value i is counted once in each of the totals below it
+        return (
+            (len(self) - 1) * self.total - sum(self.cumulative[:-1])
+        ) // self.total
+
+    def minmedmax(self) -> list[int]:
+        return sorted([*self.extrema, self.percentile(50)])
+
+    def five_number_summary(self) -> list[int]:
+        return sorted(
+            [*self.extrema] + [self.quantile(q) for q in (.25, .5, .75)]
+        )
+
+    def shrink(self, max_width: int) -> 'Histogram':
+        '''
+        merge neighbouring bins in runs of the smallest power of 2 that leaves
+        no more than `max_width` of them. bins that don't make up a full run
+        at the end get dropped.
+
+        >>> Histogram([0, 1, 1, 3, 5, 6, 2, 0, 9]).shrink(4).counts
+        [1, 4, 11, 2]
+        '''
+        shift = 0
+        while len(self) >> shift > max_width:
+            shift += 1
+        if not shift:
+            return self
+        ends = self.cumulative[(1 << shift) - 1::1 << shift]
+        return Histogram(
+            end - start for start, end in itertools.pairwise([0, *ends])
+        )
+
+
 def percentile(histogram: list[int], percent: int = 50) -> int:
     '''
     >>> percentile([1, 1, 1, 1], 50)
@@ -14,12 +136,7 @@ def percentile(histogram: list[int], percent: int = 50) -> int:
     >>> percentile([0, 3, 2, 1], 66)
     2
     '''
-    target = sum(histogram) * percent / 100
-    acc = 0
-    for _i, count in enumerate(histogram):
-        if (acc := acc + count) >= target:
-            break
-    return _i
+    return Histogram(histogram).percentile(percent)
 
 
 def extrema(histogram: list[int]) -> tuple[int, int]:
@@ -30,13 +147,7 @@ def extrema(histogram: list[int]) -> tuple[int, int]:
     >>> extrema([0, 0, 1, 0])
     (2, 2)
     '''
-    for i in range(len(histogram)):
-        if histogram[i]:
-            break
-    for j in range(len(histogram) - 1, i - 1, -1):
-        if histogram[j]:
-            break
-    return (i, j)
+    return Histogram(histogram).extrema
 
 
 def mean(histogram: list[int]) -> int:
@@ -47,23 +158,15 @@ def mean(histogram: list[int]) -> int:
     >>> mean([1] * 8)
     3
     '''
-    return sum(
-        i * x for i, x in enumerate(histogram)
-    ) // sum(histogram)
+    return Histogram(histogram).mean
 
 
 def minmedmax(histogram: list[int]) -> list[int]:
-    return sorted(
-        list(extrema(histogram)) + [percentile(histogram, 50)]
-    )
+    return Histogram(histogram).minmedmax()
 
 
 def five_number_summary(histogram: list[int]) -> list[int]:
-    return sorted(
-        minmedmax(histogram) + [
-            percentile(histogram, p) for p in (25, 75)
-        ]
-    )
+    return Histogram(histogram).five_number_summary()
 
 
 def shrink(
@@ -77,15 +180,7 @@ def shrink(
     >>> shrink([0, 1, 1, 3, 5, 6, 2, 0], 4)
     [1, 4, 11, 2]
     '''
-    def _squeeze() -> list[int]:
-        return [
-            histogram[i] + histogram[i + 1]
-            for i in range(0, len(histogram) - 1, 2)
-        ]
-
-    while len(histogram) > max_width:
-        histogram = _squeeze()
-    return histogram
+    return Histogram(histogram).shrink(max_width).counts
 
 
 type BoxplotCharset = Literal['utf8', 'ascii']
@@ -98,7 +193,7 @@ BOXPLOT_CHARS = {
 
 
 def plot(
-     histogram: list[int], c: int = 80, r: int = 10,
+     histogram: 'Iterable[int] | Histogram', c: int = 80, r: int = 10,
      fns: BoxplotCharset | None = None,
      charset: PairCharset = 'braille',
 ) -> Iterable[str]:
@@ -131,25 +226,25 @@ def plot(
      //||\\/
     =<=|==>=
     '''
-    histogram = shrink(histogram, c * 2)
+    shrunk = Histogram.of(histogram).shrink(c * 2)
     if fns:
-        yield boxplot(histogram, c, charset=fns)
-    max_frequency = max(histogram)
+        yield boxplot(shrunk, c, charset=fns)
+    max_frequency = max(shrunk.counts)
     bin_height = [
-        r * b / max_frequency for b in histogram
+        r * b / max_frequency for b in shrunk.counts
     ]
     line = []
     for j in range(r):
         y = r - j
-        for i in range(0, len(histogram) - 1, 2):
+        for i in range(0, len(shrunk) - 1, 2):
             left, right = (
                 bin_height[i + dx] - y + 1 for dx in range(2)
             )
             line.append(pair2char(left, right, charset=charset))
         yield ''.join(line)
         line.clear()
-    markers = minmedmax(histogram)
-    line = ['='] * (len(histogram) // 2)
+    markers = shrunk.minmedmax()
+    line = ['='] * (len(shrunk) // 2)
     line[markers[0] // 2] = '<'
     line[markers[2] // 2] = '>'
     line[markers[1] // 2] = '|'
@@ -157,7 +252,8 @@ def plot(
 
 
 def boxplot(
-    histogram: list[int], c: int = 80, charset: BoxplotCharset = 'utf8',
+    histogram: 'Iterable[int] | Histogram', c: int = 80,
+    charset: BoxplotCharset = 'utf8',
 ) -> str:
     '''
     >>> bins = [0, 0, 0, 2, 1, 4, 6, 5, 4, 3, 2, 1, 0, 1, 0, 0]
@@ -170,9 +266,9 @@ def boxplot(
     >>> boxplot([0, 0, 0, 5, 5, 0, 0, 0])
     '   ╋┽   '
     '''
-    histogram = shrink(histogram, c)
-    markers = five_number_summary(histogram)
-    line = [' '] * len(histogram)
+    shrunk = Histogram.of(histogram).shrink(c)
+    markers = shrunk.five_number_summary()
+    line = [' '] * len(shrunk)
     CHARS = tuple(BOXPLOT_CHARS[charset])
     for i in range(markers[0], markers[4] + 1):
         line[i] = CHARS[0]
@@ -0,0 +1,143 @@
+import contextlib
+import contextvars
+import time
+from dataclasses import dataclass
+from typing import Callable, ContextManager, Iterable, Iterator
+
+type SpanCallback = Callable[[str, float], None]
+
+
+@dataclass
+class Span:
+    '''
+    accumulated time spent in all occurrences of a pipeline stage, in ns.
+    time spent in stages nested within doesn't count as its own.
+    '''
+    name: str
+    calls: int = 0
+    total: int = 0
+    nested: int = 0
+
+    @property
+    def own(self) -> int:
+        return self.total - self.nested
+
+
+class Timings:
+    '''
+    records nested timing spans. `callback` gets called with name and
+    duration in seconds every time a span ends.
+
+    >>> timings = Timings()
+    >>> with timings.span('render'):
+    ...     rows = list(timings.iter('sample', range(3)))
+    >>> [(s.name, s.calls) for s in timings.spans.values()]
+    [('render', 1), ('sample', 4)]
+    >>> timings.spans['render'].own < timings.spans['render'].total
+    True
+    '''
+    def __init__(self, callback: SpanCallback | None = None):
+        self.callback = callback
+        self.spans: dict[str, Span] = {}
+        self.stack: list[Span] = []
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        span = self.spans.setdefault(name, Span(name))
+        self.stack.append(span)
+        start = time.perf_counter_ns()
+        try:
+            yield span
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self.stack.pop()
+            span.calls += 1
+            span.total += elapsed
+            if self.stack:
+                self.stack[-1].nested += elapsed
+            if self.callback:
+                self.callback(name, elapsed / 1e9)
+
+    def iter[T](self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        '''
+        yield from `iterable`, timing every step as a span of its own.
+        '''
+        iterator = iter(iterable)
+        while True:
+            with self.span(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def table(self) -> Iterator[str]:
+        '''
+        >>> timings = Timings()
+        >>> timings.spans['sharpen'] = Span('sharpen', 1, 2_500_000)
+        >>> print(*timings.table(), sep='\\n')
+        span            calls   total ms     own ms    own
+        sharpen             1       2.50       2.50   100%
+        '''
+        total = sum(span.own for span in self.spans.values()) or 1
+        yield f'{"span":<12}{"calls":>9}{"total ms":>11}{"own ms":>11}{"own":>7}'
+        for span in self.spans.values():
+            yield (
+                f'{span.name:<12}{span.calls:>9}{span.total / 1e6:>11.2f}'
+                f'{span.own / 1e6:>11.2f}{span.own / total:>7.0%}'
+            )
+
+    def json_lines(self) -> Iterator[str]:
+        '''
+        >>> timings = Timings()
+        >>> timings.spans['sharpen'] = Span('sharpen', 1, 2_500_000)
+        >>> print(*timings.json_lines())
+        {"span": "sharpen", "calls": 1, "total_ms": 2.5, "own_ms": 2.5}
+        '''
+        import json
+        for span in self.spans.values():
+            yield json.dumps({
+                'span': span.name, 'calls': span.calls,
+                'total_ms': span.total / 1e6, 'own_ms': span.own / 1e6,
+            })
+
+
+TIMINGS: contextvars.ContextVar[Timings | None] = contextvars.ContextVar(
+    'timings', default=None,
+)
+NOT_TIMED = contextlib.nullcontext()
+
+
+def span(name: str) -> ContextManager[object]:
+    '''
+    time a pipeline stage, if timings are being recorded.
+    '''
+    timings = TIMINGS.get()
+    return timings.span(name) if timings else NOT_TIMED
+
+
+def timed[T](name: str, iterable: Iterable[T]) -> Iterable[T]:
+    '''
+    time every step of a pipeline stage that yields its results, if timings
+    are being recorded.
+    '''
+    timings = TIMINGS.get()
+    return timings.iter(name, iterable) if timings else iterable
+
+
+@contextlib.contextmanager
+def record(callback: SpanCallback | None = None) -> Iterator[Timings]:
+    '''
+    record timing spans of all pipeline stages run within the context.
+
+    >>> with record() as timings:
+    ...     with span('output'):
+    ...         pass
+    >>> list(timings.spans), TIMINGS.get()
+    (['output'], None)
+    '''
+    token = TIMINGS.set(timings := Timings(callback))
+    try:
+        yield timings
+    finally:
+        TIMINGS.reset(token)
@@ -1,15 +1,132 @@
+import collections
+import contextlib
+import contextvars
 import io
-from typing import Any, Self
+import itertools
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Iterator, Self
 
+Level = IntEnum('Level', [('debug', 10), ('info', 20), ('warning', 30)])
 
-class Debug:
-    msgs: list[str] = []
+# messages kept per log, older ones get dropped
+DEFAULT_LOG_SIZE = 1000
+
+
+@dataclass
+class Message:
+    level: Level
+    msg: str
+    args: tuple[object, ...]
+
+    def __str__(self) -> str:
+        '''
+        >>> str(Message(Level.debug, 'resize image to %.1f%%', (42.195,)))
+        'resize image to 42.2%'
+        >>> str(Message(Level.warning, '100% broken', ()))
+        'warning: 100% broken'
+        '''
+        text = self.msg % self.args if self.args else self.msg
+        if self.level > Level.info:
+            return f'{self.level.name}: {text}'
+        return text
+
+
+class DebugLog:
+    '''
+    messages of at least `level`, of which the last `size` are kept. they
+    only get formatted once somebody reads them.
+
+    >>> log = DebugLog(Level.info, size=2)
+    >>> for n in range(4):
+    ...     log.log('message %d', n, level=Level.info)
+    >>> log.log('not kept')
+    >>> log.lines()
+    ['(2 earlier messages dropped)', 'message 2', 'message 3']
+    '''
+    def __init__(self, level: Level = Level.debug, size: int = DEFAULT_LOG_SIZE):
+        self.level = level
+        self.messages: collections.deque[Message] = collections.deque(
+            maxlen=size,
+        )
+        self.logged = 0
+
+    def log(self, msg: str, *args: object, level: Level = Level.debug) -> None:
+        if level < self.level:
+            return
+        self.messages.append(Message(level, msg, args))
+        self.logged += 1
+
+    def lines(self, since: int = 0) -> list[str]:
+        '''
+        messages logged after the first `since` ones.
+        '''
+        dropped = self.logged - len(self.messages)
+        return (
+            [f'({dropped - since} earlier messages dropped)']
+            if dropped > since else []
+        ) + [
+            str(message) for message in
+            itertools.islice(self.messages, max(0, since - dropped), None)
+        ]
 
+
+# log shared by code which doesn't set up a log of its own
+FALLBACK_LOG = DebugLog()
+# log of the render going on, `None` while nothing gets logged
+LOG: contextvars.ContextVar[DebugLog | None] = contextvars.ContextVar(
+    'log', default=FALLBACK_LOG,
+)
+
+
+class Debug:
     @classmethod
-    def log(cls, msg: str) -> type[Self]:
-        cls.msgs.append(msg)
+    def log(
+        cls, msg: str, *args: object, level: Level = Level.debug,
+    ) -> type[Self]:
+        '''
+        log `msg`, %-formatted with `args` only if the log gets read.
+        '''
+        if log := LOG.get():
+            log.log(msg, *args, level=level)
         return cls
 
     @classmethod
-    def show(cls, out: io.TextIOBase | Any) -> None:
-        print('\n'.join(cls.msgs), file=out)
+    def lines(cls, since: int = 0) -> list[str]:
+        log = LOG.get()
+        return log.lines(since) if log else []
+
+    @classmethod
+    def show(cls, out: io.TextIOBase | Any, since: int = 0) -> int:
+        '''
+        print messages logged after the first `since` ones, and return how
+        many have been logged by now.
+        '''
+        if (lines := cls.lines(since)) or not since:
+            print('\n'.join(lines), file=out)
+        log = LOG.get()
+        return log.logged if log else 0
+
+    @classmethod
+    @contextlib.contextmanager
+    def scope(
+        cls, enabled: bool = True, level: Level = Level.debug,
+        size: int = DEFAULT_LOG_SIZE,
+    ) -> Iterator[DebugLog | None]:
+        '''
+        log messages into a log of their own within the context, e.g. for a
+        single render, or not at all unless `enabled`.
+
+        >>> with Debug.scope() as log:
+        ...     _ = Debug.log('a').log('b %s', 'c')
+        ...     with Debug.scope(enabled=False):
+        ...         _ = Debug.log('d')
+        >>> log.lines()
+        ['a', 'b c']
+        '''
+        log = DebugLog(level, size) if enabled else None
+        token = LOG.set(log)
+        try:
+            yield log
+        finally:
+            LOG.reset(token)
@@ -0,0 +1,181 @@
+from typing import Any, Iterable
+
+import numpy as np
+import numpy.typing as npt
+
+from . import pxp
+from .args import DitherMethod, Resampling
+from .chars import BRAILLE_TABLE
+from .img import ImgData, PlaneThresholdMap, ThresholdMap
+
+BRAILLE_DOT_MASK = np.array(
+    [
+        [0x01, 0x08],
+        [0x02, 0x10],
+        [0x04, 0x20],
+        [0x40, 0x80],
+    ], dtype=np.uint8,
+)
+
+type Plane = npt.NDArray[Any]
+
+
+def sample(
+    img: ImgData,
+    sx: float, sy: float,
+    cols: int, rows: int,
+    interpolate: bool = True,
+    top: int = 0,
+) -> Plane:
+    '''
+    sample a `rows`×`cols` dot grid at the same positions and with the same
+    arithmetic as `pxp.sample_func` does one dot at a time.
+
+    >>> from PIL import Image
+    >>> imdat = ImgData(Image.frombytes('L', (2, 2), b'\\x00\\x40\\x80\\xff'))
+    >>> sample(imdat, .5, .5, 3, 3).tolist()
+    [[0, 32, 64], [64, 112, 160], [128, 192, 255]]
+
+    >>> sample(imdat, .5, .5, 3, 1, top=2).tolist()
+    [[128, 192, 255]]
+    '''
+    pixels = np.frombuffer(img.pixels, dtype=np.uint8)
+    width, height = img.width, img.height
+    px = (sx * np.arange(cols, dtype=np.float64))[np.newaxis, :]
+    py = (sy * np.arange(top, top + rows, dtype=np.float64))[:, np.newaxis]
+    x1 = px.astype(np.int64)
+    y1 = py.astype(np.int64)
+
+    def getpixels(x: Plane, y: Plane) -> Plane:
+        values: Plane = pixels.take(x + y * width, mode='clip')
+        return values.astype(np.int64)
+
+    v1 = getpixels(x1, y1)
+    if not interpolate:
+        result = v1
+    else:
+        right, below = x1 + 1 < width, y1 + 1 < height
+        v2 = np.where(right, getpixels(x1 + 1, y1), v1)
+        v3 = np.where(below, getpixels(x1, y1 + 1), v1)
+        v4 = np.where(right & below, getpixels(x1 + 1, y1 + 1), v1)
+        dx, dy = px - x1, py - y1
+        wx1 = v1 + (v2 - v1) * dx
+        wx2 = v3 + (v4 - v3) * dx
+        result = np.rint(wx1 + (wx2 - wx1) * dy).astype(np.int64)
+    return np.where((px > width) | (py > height), 0, result)
+
+
+def threshold_plane(
+    threshold: ThresholdMap,
+    sx: float, sy: float,
+    cols: int, rows: int,
+    top: int = 0,
+) -> Plane:
+    '''
+    >>> from PIL import Image
+    >>> image = Image.frombytes('L', (2, 2), bytes((16, 32, 48, 64)))
+    >>> threshold_plane(PlaneThresholdMap(image), .5, 1.5, 4, 3).tolist()
+    [[16.0, 16.0, 32.0, 32.0], [48.0, 48.0, 64.0, 64.0], [0.0, 0.0, 0.0, 0.0]]
+    '''
+    if threshold.scalar is not None:
+        return np.full((rows, cols), threshold.scalar, dtype=np.float64)
+    xs = sx * np.arange(cols, dtype=np.float64)
+    ys = sy * np.arange(top, top + rows, dtype=np.float64)
+    if isinstance(threshold, PlaneThresholdMap):
+        pixels = np.frombuffer(threshold.pixels, dtype=np.uint8)
+        values = pixels.take(
+            (xs / threshold.scale).astype(np.int64)[np.newaxis, :] +
+            (ys / threshold.scale).astype(np.int64)[:, np.newaxis] *
+            threshold.stride,
+            mode='clip',
+        ).astype(np.float64)
+        return np.where(
+            (xs > threshold.width)[np.newaxis, :] |
+            (ys > threshold.height)[:, np.newaxis],
+            0, values,
+        )
+    return np.fromiter(
+        (
+            value for row in threshold.rows(xs.tolist(), ys.tolist())
+            for value in row
+        ), dtype=np.float64, count=cols * rows,
+    ).reshape(rows, cols)
+
+
+def characterize(mono: Plane, inverted: bool) -> Iterable[str]:
+    '''
+    >>> mono = np.array([[1, 0, 0, 1], [0, 1, 0, 0], [1, 0, 0, 0], [0, 1, 1, 1]])
+    >>> list(characterize(mono.astype(bool), False))
+    ['⢕⣈']
+    '''
+    rows, cols = mono.shape
+    cells = mono.reshape(rows // 4, 4, cols // 2, 2) * BRAILLE_DOT_MASK[
+        np.newaxis, :, np.newaxis, :
+    ]
+    codes = cells.sum(axis=(1, 3), dtype=np.uint8)
+    if inverted:
+        codes ^= 0xff
+    for row in codes:
+        yield row.tobytes().decode('latin-1').translate(BRAILLE_TABLE)
+
+
+def rasterize(
+    imdat: ImgData,
+    sx: float, sy: float, max_col: int, max_row: int,
+    /, *,
+    interpolate: bool,
+    resample: Resampling,
+    threshold: ThresholdMap,
+    dither_method: DitherMethod,
+    adjust_brightness: float,
+    dither: float,
+    inverted: bool,
+    serpentine: bool = False,
+) -> Iterable[str]:
+    cols = max_col * 2
+    samples: Iterable[Plane]
+    if resample == Resampling.point:
+        samples = (
+            sample(imdat, sx, sy, cols, 4, interpolate=interpolate, top=top)
+            for top in range(0, max_row * 4, 4)
+        )
+    else:
+        samples = iter(np.frombuffer(
+            pxp.resample(imdat, sx, sy, cols, max_row * 4, resample),
+            dtype=np.uint8,
+        ).astype(np.int64).reshape(max_row, 4, cols))
+    bands = (
+        (grid, threshold_plane(threshold, sx, sy, cols, 4, top=top))
+        for grid, top in zip(samples, range(0, max_row * 4, 4), strict=True)
+    )
+    if dither and dither_method in pxp.THRESHOLD_MATRICES:
+        offsets = np.array(pxp.threshold_offsets(dither_method, dither))
+        n = len(offsets)
+        tiled = np.tile(offsets, (-(-max_row * 4 // n), -(-cols // n)))
+        for (grid, thresholds), top in zip(
+            bands, range(0, max_row * 4, 4), strict=True,
+        ):
+            yield from characterize(
+                grid * adjust_brightness >=
+                thresholds + tiled[top:top + 4, :cols],
+                inverted,
+            )
+        return
+    if not dither:
+        for grid, thresholds in bands:
+            yield from characterize(
+                grid * adjust_brightness >= thresholds, inverted,
+            )
+        return
+    rows = (
+        row for grid, thresholds in bands
+        for row in zip(grid.tolist(), thresholds.tolist(), strict=True)
+    )
+    mono = pxp.diffuse(
+        rows, cols,
+        dither_method=dither_method,
+        adjust_brightness=adjust_brightness,
+        dither=dither,
+        serpentine=serpentine,
+    )
+    yield from pxp.characterize(mono, inverted)
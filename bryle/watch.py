@@ -0,0 +1,108 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import pathlib
+import sys
+import time
+from typing import Callable, Iterator
+
+from PIL import Image
+
+from . import terminal_rcwh
+from .pipeline import render
+from .redraw import OUTPUT_STYLE, Screen
+from .util import Debug, Level
+
+type FileState = tuple[int, int] | None
+
+
+def file_state(path: pathlib.Path) -> FileState:
+    '''
+    modification time and size of a file, or `None` if it doesn't exist.
+    '''
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def changes(
+    path: pathlib.Path, interval: float,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[bytes]:
+    '''
+    poll file for changes of modification time or size, and yield its
+    contents whenever it has changed and then stayed the same for another
+    `interval`, so that files which are still being written get skipped.
+    '''
+    seen: FileState = None
+    while True:
+        state = file_state(path)
+        if state is None or state == seen:
+            sleep(interval)
+            continue
+        sleep(interval)
+        if file_state(path) != state:
+            Debug.log('%s is still being written to', path)
+            continue
+        seen = state
+        yield path.read_bytes()
+
+
+def watch(
+    path: pathlib.Path, options: argparse.Namespace,
+    file: io.TextIOWrapper,
+    rcwh_func: Callable[
+        [], tuple[int, int, int, int]
+    ] = terminal_rcwh,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[int]:
+    '''
+    render image file again every time it changes, reusing the terminal
+    geometry probed at the start. contents which don't decode get skipped
+    and leave the previous rendering in place. yields the number of times
+    the image has been rendered so far.
+    '''
+    rcwh = rcwh_func()
+    screen = Screen(style=OUTPUT_STYLE, rows=rcwh[0]) if (
+        file.isatty()
+    ) else None
+    digest, renders = b'', 0
+    for content in changes(path, options.poll_interval, sleep=sleep):
+        if digest == (digest := hashlib.blake2b(content).digest()):
+            Debug.log('%s changed without changing its contents', path)
+            continue
+        try:
+            image = Image.open(io.BytesIO(content))
+            lines = list(render(image, options, rcwh_func=lambda: rcwh))
+        except Exception as e:
+            Debug.log(
+                'failed to render %s: %s', path, e, level=Level.warning,
+            )
+            digest = b''
+            continue
+        file.write(
+            screen.update(lines, diff=not options.color) if screen
+            else ''.join(f'{line}\n' for line in lines)
+        )
+        file.flush()
+        renders += 1
+        Debug.log('rendered %s (%d times so far)', path, renders)
+        yield renders
+
+
+def watch_file(options: argparse.Namespace) -> int:
+    if options.inputfile == '-':
+        raise SystemExit('--watch needs a file to watch, not stdin.')
+    Debug.log('watching input file: %s', options.inputfile)
+    with (
+        options.outputfile.open('w') as f,
+        contextlib.suppress(KeyboardInterrupt),
+    ):
+        for _ in watch(pathlib.Path(options.inputfile), options, f):
+            pass
+    if options.debug:
+        Debug.show(sys.stderr)
+    return 0
@@ -0,0 +1,114 @@
+import io
+import pathlib
+import tempfile
+from typing import Iterable
+
+import pytest
+from PIL import Image, ImageOps
+
+from bryle import main
+from bryle.anim import Prefetch, frames, play
+from bryle.args import parse_args
+
+
+class Clock:
+    def __init__(self, cost: float = 0):
+        self.now = 0.
+        self.cost = cost
+
+    def __call__(self) -> float:
+        self.now += self.cost
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture(scope='module')
+def animation(image: Image.Image) -> Iterable[pathlib.Path]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / 'anim.gif'
+        image.save(
+            path, save_all=True, duration=100, loop=0,
+            append_images=[
+                ImageOps.invert(image) if i % 2 else image.rotate(i * 10)
+                for i in range(1, 6)
+            ],
+        )
+        yield path
+
+
+class Tty(io.StringIO):
+    def isatty(self) -> bool:
+        return True
+
+
+def play_animation(
+    path: pathlib.Path, clock: Clock, argv: str = '', tty: bool = False,
+) -> tuple[int, str]:
+    options = parse_args(f'{path} -P -z .2 {argv}'.split())
+    out = Tty() if tty else io.StringIO()
+    result = play(
+        Image.open(path), options, out,  # type: ignore[arg-type]
+        rcwh_func=lambda: (20, 40, 360, 380),
+        clock=clock, sleep=clock.sleep,
+    )
+    return result, out.getvalue()
+
+
+def test_frames(animation: pathlib.Path) -> None:
+    decoded = list(frames(Image.open(animation), loops=2))
+    assert [frame.index for frame in decoded] == [0, 1, 2, 3, 4, 5] * 2
+    assert {frame.duration for frame in decoded} == {.1}
+
+
+def test_play_all_frames_in_time(animation: pathlib.Path) -> None:
+    clock = Clock()
+    result, out = play_animation(animation, clock)
+    assert result == 0
+    assert clock.now == pytest.approx(.6)
+    lines = out.splitlines()
+    assert len(lines) % 6 == 0
+    height = len(lines) // 6
+    assert len({
+        tuple(lines[i:i + height]) for i in range(0, len(lines), height)
+    }) > 2
+
+
+def test_play_drops_frames_when_falling_behind(
+    animation: pathlib.Path,
+) -> None:
+    _, out = play_animation(animation, Clock(cost=.04))
+    lines = out.splitlines()
+    _, full = play_animation(animation, Clock())
+    assert 0 < len(lines) < len(full.splitlines())
+
+
+def test_prefetch_forwards_errors() -> None:
+    def items() -> Iterable[int]:
+        yield 1
+        raise ValueError('fya')
+
+    with pytest.raises(ValueError, match='fya'):
+        list(Prefetch(items()))
+
+
+def test_prefetch_stops_early() -> None:
+    for item in Prefetch(range(100), size=1):
+        if item == 3:
+            break
+
+
+def test_play_cli(animation: pathlib.Path) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        outfile = pathlib.Path(tmp) / 'out.txt'
+        assert main(f'{animation} -P -z .1 -d -o {outfile}'.split()) == 0
+        assert outfile.read_text()
+
+
+def test_play_redraws_changes_only(animation: pathlib.Path) -> None:
+    _, diff = play_animation(animation, Clock(), '-z 1', tty=True)
+    _, full = play_animation(
+        animation, Clock(), '-z 1 --redraw full', tty=True,
+    )
+    assert len(diff.encode()) < len(full.encode())
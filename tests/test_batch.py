@@ -0,0 +1,104 @@
+import io
+import multiprocessing
+import os
+import pathlib
+import tempfile
+from unittest import mock
+
+import pytest
+from PIL import Image
+
+from bryle import batch, load_image_file, main
+from bryle.args import parse_args
+
+
+def render_single(inputfile: str, outputfile: pathlib.Path) -> list[str]:
+    main(f'{inputfile} -o {outputfile} -f -e.5'.split())
+    return outputfile.read_text().splitlines()
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+@mock.patch.dict('os.environ', {'TERM_RCWH': '20x40'})
+def test_batch_keeps_input_order(
+    capsys: pytest.CaptureFixture[str], jobs: int,
+) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        expected = [
+            line for inputfile in ('shelly.jpg', 'eppels.png')
+            for line in render_single(inputfile, pathlib.Path(tmp) / 'out')
+        ]
+    capsys.readouterr()
+    assert batch.main(
+        f'shelly.jpg missing.png eppels.* -e.5 -j{jobs}'.split()
+    ) == 1
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == expected
+    assert 'missing.png: FileNotFoundError' in captured.err
+
+
+@mock.patch.dict('os.environ', {'TERM_RCWH': '20x40'})
+def test_batch_output_template(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        template = f'{tmp}/{{index}}-{{stem}}.txt'
+        with mock.patch('sys.stdin', io.StringIO('eppels.png\n\nshelly.jpg')):
+            assert batch.main(['-o', template, '-j1', '-d']) == 0
+        assert sorted(path.name for path in pathlib.Path(tmp).iterdir()) == [
+            '0-eppels.txt', '1-shelly.txt',
+        ]
+        assert batch.main(['eppels.png', '-o', template, '-j1']) == 1
+    captured = capsys.readouterr()
+    assert not captured.out
+    assert 'rendered 2 of 2 files' in captured.err
+    assert 'FileExistsError' in captured.err
+
+
+@mock.patch.dict('os.environ', {'TERM_RCWH': '20x40'})
+def test_batch_output_template_trims(tmp_path: pathlib.Path) -> None:
+    assert batch.main(
+        ['shelly.jpg', '-o', f'{tmp_path}/{{stem}}.txt', '-j1', '--trim']
+    ) == 0
+    lines = (tmp_path / 'shelly.txt').read_text().splitlines()
+    assert lines
+    assert not any(line.endswith('\u2800') for line in lines)
+    assert any(len(line) < max(map(len, lines)) for line in lines)
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != 'fork',
+    reason='workers need to inherit the patched loader',
+)
+@mock.patch.dict('os.environ', {'TERM_RCWH': '20x40'})
+def test_batch_survives_dying_workers(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    def load(inputfile: str) -> Image.Image:
+        if inputfile == 'crash.png':
+            os._exit(1)
+        return load_image_file(inputfile)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        expected = [
+            line for inputfile in ('shelly.jpg', 'eppels.png')
+            for line in render_single(inputfile, pathlib.Path(tmp) / 'out')
+        ]
+    capsys.readouterr()
+    with mock.patch('bryle.batch.load_image_file', load):
+        assert batch.main(
+            ['shelly.jpg', 'crash.png', 'eppels.png', '-e.5', '-j2'],
+        ) == 1
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == expected
+    assert 'crash.png: BrokenProcessPool' in captured.err
+    assert 'shelly.jpg:' not in captured.err
+    assert 'eppels.png:' not in captured.err
+
+
+@pytest.mark.parametrize(
+    'option', ('--serve x', '-W', '-P', '--loops 2', '--cache x', '--timings'),
+)
+def test_batch_rejects_single_image_options(option: str) -> None:
+    with pytest.raises(SystemExit):
+        parse_args(['eppels.png', *option.split()], batch=True)
+    parse_args(['eppels.png', *option.split()])
@@ -0,0 +1,64 @@
+import os
+import pathlib
+import tempfile
+from typing import Iterable
+from unittest import mock
+
+import pytest
+
+from bryle import main
+from bryle.cache import RenderCache
+from bryle.util import Debug
+
+
+@pytest.fixture
+def cachedir() -> Iterable[pathlib.Path]:
+    with tempfile.TemporaryDirectory() as tmp:
+        yield pathlib.Path(tmp) / 'cache'
+
+
+@mock.patch.dict('os.environ', {'TERM_RCWH': '20x40'})
+def test_cached_rendering(
+    cachedir: pathlib.Path, capsys: pytest.CaptureFixture[str],
+) -> None:
+    outputs = []
+    for argv in ('-e.5', '-e.5 -d', '-e.5 --no-cache', '-e.4', '-e.5'):
+        main(
+            f'eppels.png --cache {cachedir} --cache-stats {argv} '
+            f'-o {cachedir.parent}/out.txt -f'.split()
+        )
+        outputs.append((
+            (cachedir.parent / 'out.txt').read_text(), capsys.readouterr().err,
+        ))
+    assert len({out for out, _ in outputs}) == 2
+    assert outputs[3][0] != outputs[0][0]
+    assert outputs[0][1].endswith('1 entries, 0.00 of 64.00 MiB used, 0 hits, 1 misses\n')  # noqa: B950
+    assert 'render cache hit' in outputs[1][1]
+    assert not outputs[2][1]
+    assert outputs[3][1].endswith('2 entries, 0.00 of 64.00 MiB used, 0 hits, 1 misses\n')  # noqa: B950
+    assert outputs[4][1].endswith('2 entries, 0.00 of 64.00 MiB used, 1 hits, 0 misses\n')  # noqa: B950
+
+
+def test_cache_eviction(cachedir: pathlib.Path) -> None:
+    cache = RenderCache(cachedir, max_bytes=1000)
+    for i, key in enumerate('abcd'):
+        cache.put(key, ['⣿' * 10])
+        os.utime(cache.path(key), (i, i))
+    assert cache.get('b')
+    cache.max_bytes = 70
+    with Debug.scope():
+        cache.put('e', ['⣿' * 10])
+        assert 'render cache evicted: d' in Debug.lines()
+    assert sorted(path.stem for path in cachedir.iterdir()) == ['b', 'e']
+    assert cache.get('a') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_failed_writes_leave_nothing_behind(cachedir: pathlib.Path) -> None:
+    cache = RenderCache(cachedir, max_bytes=1000)
+    with (
+        mock.patch('os.replace', side_effect=OSError('disk full')),
+        pytest.raises(OSError, match='disk full'),
+    ):
+        cache.put('a', ['⣿' * 10])
+    assert not list(cachedir.iterdir())
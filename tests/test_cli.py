@@ -5,16 +5,19 @@ from typing import Callable, Iterable, TextIO
 from unittest import mock
 
 import pytest
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 
 from bryle import (
     get_zoom_factor,
+    load_image_file,
     main,
     plot_image_histogram,
     rasterize,
+    render,
     terminal_rcwh,
 )
-from bryle.args import DitherMethod, parse_args
+from bryle.args import DitherMethod, Resampling, parse_args
+from bryle.img import local_blur_radius
 
 
 @pytest.mark.parametrize(
@@ -149,18 +152,16 @@ def test_cli_creates_file(
         '20x44',
     )
 )
-@mock.patch('bryle.os.environ.get')
 def test_overwrite_terminal_size_via_env_var(
-    os_environ_get_mock: mock.MagicMock,
     tmpfile: pathlib.Path,
     load_cached_image: Callable[[str], Image.Image],
     rcwh_var: str,
 ) -> None:
-    os_environ_get_mock.side_effect = lambda k: rcwh_var
-    main(
-        f'eppels.png -o {tmpfile} -xydA'.split(),
-        load_image_file_func=load_cached_image,
-    )
+    with mock.patch.dict('os.environ', {'TERM_RCWH': rcwh_var}):
+        main(
+            f'eppels.png -o {tmpfile} -xydA'.split(),
+            load_image_file_func=load_cached_image,
+        )
     output = tmpfile.read_text().split('\n')
     expected_width = int(rcwh_var.split('x')[1])
     assert len(output[0]) == expected_width
@@ -169,18 +170,16 @@ def test_overwrite_terminal_size_via_env_var(
 @pytest.mark.parametrize(
     'columns', (13, 52, 91)
 )
-@mock.patch('bryle.os.environ.get')
 def test_fit_to_width(
-    os_environ_get_mock: mock.MagicMock,
     tmpfile: pathlib.Path,
     load_cached_image: Callable[[str], Image.Image],
     columns: int,
 ) -> None:
-    os_environ_get_mock.side_effect = lambda k: f'20x{columns}'
-    main(
-        f'eppels.png -o {tmpfile} -xydA'.split(),
-        load_image_file_func=load_cached_image,
-    )
+    with mock.patch.dict('os.environ', {'TERM_RCWH': f'20x{columns}'}):
+        main(
+            f'eppels.png -o {tmpfile} -xydA'.split(),
+            load_image_file_func=load_cached_image,
+        )
     output = tmpfile.read_text().split('\n')
     assert len(output[2]) == columns, (
         f'output lines should be {columns} columns in length '
@@ -288,10 +287,104 @@ def test_histogram(
     image: Image.Image,
     capsys: pytest.CaptureFixture[str],
 ) -> None:
-    options = parse_args('-Hd f.tif -t20'.split())  # noqa: SIM905
+    options = parse_args('-Hd f.tif -mgaussian -t20'.split())  # noqa: SIM905
     plot_image_histogram(image, options, charset='blocks')
     capture = capsys.readouterr()
     stdout = capture.out
     assert '─┾━━━━━━━━━━━━━━━━━━╋━━┽─' in stdout
     assert '─┾━━━━━━━━╋━━━━┽─' in stdout, f'{stdout}'
-    assert 'gaussian blur radius for `local` mode: 20' in capture.err
+    assert 'gaussian blur radius for `gaussian` mode: 20' in capture.err
+
+
+@pytest.mark.parametrize(
+    'mode, edging', (
+        ('RGB', 0),
+        ('RGB', 2),
+        ('L', 1),
+        ('P', 0),
+        ('1', 0),
+    )
+)
+def test_working_resolution(mode: str, edging: int) -> None:
+    image = Image.open('shelly.jpg').convert(mode)
+    rcwh_func = lambda: (44, 80, 880, 836)  # noqa: E731
+    lines = {
+        full_resolution: list(rasterize(
+            image, zoom=.5, edging=edging, resample=Resampling.box,
+            full_resolution=full_resolution, rcwh_func=rcwh_func,
+        ))
+        for full_resolution in (True, False)
+    }
+    assert list(map(len, lines[True])) == list(map(len, lines[False]))
+    dots = {
+        full_resolution: sum(
+            (ord(char) - 0x2800).bit_count() for char in ''.join(text)
+        )
+        for full_resolution, text in lines.items()
+    }
+    assert dots[False] == pytest.approx(dots[True], rel=.05)
+
+
+@pytest.mark.parametrize(
+    'suffix, zoom, scale', (
+        ('jpg', .25, '1/4'),
+        ('jpg', .1, '1/8'),
+        ('png', .25, '1/6'),
+    )
+)
+@mock.patch.dict('os.environ', {'TERM_RCWH': '44x80'})
+def test_reduced_scale_decoding(
+    image: Image.Image, tmpfile: pathlib.Path,
+    capsys: pytest.CaptureFixture[str],
+    suffix: str, zoom: float, scale: str,
+) -> None:
+    inputfile = tmpfile.with_suffix(f'.{suffix}')
+    image.resize((1600, 1200)).save(inputfile)
+    main(f'{inputfile} -o {tmpfile} -d -z {zoom}'.split())
+    inputfile.unlink()
+    assert f'decode image at scale {scale}:' in capsys.readouterr().err
+    assert len(tmpfile.read_text().split('\n')[0]) == round(1600 * zoom / 9)
+
+
+@pytest.mark.parametrize('suffix', ('jpg', 'png'))
+@pytest.mark.parametrize('mode', ('gaussian', 'local'))
+def test_decoded_blur_radius(
+    image: Image.Image, tmp_path: pathlib.Path, suffix: str, mode: str,
+) -> None:
+    inputfile = tmp_path / f'big.{suffix}'
+    image.resize((1600, 1200)).save(inputfile)
+    radii = {}
+    for full_resolution in (True, False):
+        options = parse_args(
+            f'{inputfile} -m {mode} -t 160 -z .25'
+            f'{" --full-res" * full_resolution}'.split()
+        )
+        with mock.patch(
+            'bryle.img.local_blur_radius', wraps=local_blur_radius,
+        ) as blur_radius:
+            list(render(
+                load_image_file(str(inputfile)), options,
+                rcwh_func=lambda: (44, 80, 880, 836),
+            ))
+        [(working, radius), _] = blur_radius.call_args
+        # blur radius in pixels of the source image
+        radii[full_resolution] = radius * 1600 / working.width
+    assert radii[True] == 160
+    assert radii[False] == pytest.approx(160, rel=.1)
+
+
+def test_lazy_loading(
+    image: Image.Image, tmpfile: pathlib.Path,
+) -> None:
+    loaded = load_image_file('eppels.png')
+    assert loaded.convert('L').tobytes() == image.tobytes()
+    tmpfile.write_bytes(b'')
+    with pytest.raises(UnidentifiedImageError):
+        load_image_file(str(tmpfile))
+    # files truncated before decoding raise instead of crashing the process
+    data = pathlib.Path('shelly.jpg').read_bytes()
+    tmpfile.write_bytes(data)
+    loaded = load_image_file(str(tmpfile))
+    tmpfile.write_bytes(data[:len(data) // 2])
+    with pytest.raises(OSError, match='truncated'):
+        loaded.load()
@@ -0,0 +1,76 @@
+import itertools
+import pathlib
+import re
+from unittest import mock
+
+import pytest
+from PIL import Image
+
+from bryle import load_image_file, main, render
+from bryle.args import ColorMode, parse_args
+from bryle.color import Colors
+from bryle.redraw import RESET_STYLE
+
+RCWH = (20, 40, 360, 380)
+SGR = re.compile(r'\x1b\[[0-9;]*m')
+
+
+@pytest.mark.parametrize('argv', ('', '-e.5', '-e.5 -Dbayer4', '-Eparallel'))
+def test_colors_leave_characters_alone(argv: str) -> None:
+    def rows(*color: str) -> list[str]:
+        return list(render(
+            load_image_file('shelly.jpg'),
+            parse_args(['shelly.jpg', *argv.split(), *color]),
+            rcwh_func=lambda: RCWH,
+        ))
+
+    mono, colored = rows(), rows('-C', '--palette', '8')
+    assert [SGR.sub('', row) for row in colored] == mono
+    for row, plain in zip(colored, mono, strict=True):
+        sequences = SGR.findall(row)
+        if not sequences:
+            assert set(plain) == {'⠀'}
+            continue
+        assert row.endswith(RESET_STYLE)
+        # a sequence only where the color changes, and a reset at the end
+        colors = sequences[:-1]
+        assert 0 < len(colors) <= len(plain)
+        assert all(a != b for a, b in itertools.pairwise(colors))
+    assert len({seq for row in colored for seq in SGR.findall(row)}) <= 8 + 1
+
+
+def test_color_modes() -> None:
+    image = Image.new('RGB', (8, 8), (0, 0, 255))
+    image.paste((255, 0, 0), (4, 0, 8, 8))
+    line = '⣿⣿⠀⣿'
+    for mode, red, blue in (
+        (ColorMode['256'], '38;5;196', '38;5;21'),
+        (ColorMode.truecolor, '38;2;255;0;0', '38;2;0;0;255'),
+    ):
+        [colored] = Colors(image, 1, mode).apply([line], 1, 2, 4, 1)
+        # the blank character doesn't need a color of its own
+        assert colored == (
+            f'\x1b[{blue}m⣿⣿⠀\x1b[{red}m⣿{RESET_STYLE}'
+        )
+    assert list(Colors(image, 1, ColorMode['256']).apply(
+        ['⠀' * 4], 1, 2, 4, 1,
+    )) == ['⠀' * 4]
+
+
+@mock.patch.dict('os.environ', {'TERM_RCWH': '20x40'})
+def test_trimmed_color_rows(tmp_path: pathlib.Path) -> None:
+    rows = {}
+    for trim in (False, True):
+        outputfile = tmp_path / f'trim-{trim}.txt'
+        main(
+            f'eppels.png -o {outputfile} -v -C truecolor{" --trim" * trim}'
+            .split()
+        )
+        rows[trim] = outputfile.read_text().splitlines()
+    assert len(rows[True]) == len(rows[False]) == 8
+    assert any(SGR.sub('', row).endswith('⠀') for row in rows[False])
+    for row, full in zip(rows[True], rows[False], strict=True):
+        text = SGR.sub('', row)
+        assert not text.endswith('⠀')
+        assert SGR.sub('', full).startswith(text)
+        assert row.endswith(RESET_STYLE) is full.endswith(RESET_STYLE)
@@ -1,7 +1,21 @@
+import argparse
+import concurrent.futures
+import multiprocessing
+import pickle
+from unittest import mock
+
 import pytest
 from PIL import Image
 
-from bryle.img import ImgData
+from bryle import get_zoom_factor, par, pxp, rasterize
+from bryle.args import DitherMethod, Engine, Resampling, parse_args
+from bryle.chars import braille, braille_row
+from bryle.img import (
+    ImgData,
+    get_threshold_func,
+    thr_gaussian_factory,
+    thr_local_avg_factory,
+)
 from bryle.pxp import sample_func
 
 
@@ -23,3 +37,281 @@ def test_sampling(x: int, y: int, value: int) -> None:
     )
     sample = sample_func(imdat, .5, .5)
     assert sample(x, y) == value
+
+
+@pytest.mark.parametrize(
+    'argv', (
+        '',
+        '-A',
+        '-v -z 1.5',
+        '-m const -t 100',
+        '-m extrema -b 150',
+        '-m local -t 5 -x',
+        '-m local -t 60',
+        '-m gaussian',
+        '-e .5',
+        '-e --floyd -A',
+        '-e .8 -S',
+        '-r box -x',
+        '-r lanczos -e',
+        '-r bilinear -y',
+        '-e -D bayer4',
+        '-e .5 -D blue-noise -m gaussian',
+        '-e -D bayer8 -m const -b 120',
+    )
+)
+def test_numpy_engine_output_identical(
+    image: Image.Image, argv: str,
+) -> None:
+    pytest.importorskip('numpy')
+    options = parse_args(['f.png'] + argv.split())
+
+    def render(engine: Engine) -> list[str]:
+        rcwh_func = lambda: (44, 80, 880, 836)  # noqa: E731
+        return list(rasterize(
+            image,
+            zoom=get_zoom_factor(
+                image, options.zoom_factor, rcwh_func=rcwh_func,
+            ),
+            inverted=options.invert,
+            resample=options.resample,
+            dither=options.error_preservation_factor,
+            dither_method=options.dither_method,
+            serpentine=options.serpentine,
+            threshold_func=get_threshold_func(image, options),
+            adjust_brightness=options.brightness / 100,
+            engine=engine,
+            rcwh_func=rcwh_func,
+        ))
+
+    assert render(Engine.numpy) == render(Engine.python)
+
+
+@mock.patch('bryle.pxp.importlib.util.find_spec', return_value=None)
+def test_numpy_engine_fallback(
+    _find_spec_mock: mock.MagicMock, image: Image.Image,
+) -> None:
+    rcwh_func = lambda: (44, 80, 880, 836)  # noqa: E731
+    fallback = rasterize(image, engine=Engine.numpy, rcwh_func=rcwh_func)
+    assert list(fallback) == list(rasterize(image, rcwh_func=rcwh_func))
+
+
+@pytest.mark.parametrize(
+    'argv', (
+        '',
+        '-m const -t 100',
+        '-m gaussian -A',
+        '-e',
+        '-e .6 --floyd',
+        '-e .8 -S',
+        '-e --floyd -S -v',
+        '-r box -e',
+        '-e -D bayer2 -m gaussian',
+        '-e -D blue-noise',
+    )
+)
+def test_parallel_engine_output_identical(
+    image: Image.Image, argv: str,
+) -> None:
+    options = parse_args(['f.png'] + argv.split())
+
+    def render(engine: Engine) -> list[str]:
+        rcwh_func = lambda: (60, 80, 800, 900)  # noqa: E731
+        return list(rasterize(
+            image,
+            zoom=2,
+            inverted=options.invert,
+            resample=options.resample,
+            dither=options.error_preservation_factor,
+            dither_method=options.dither_method,
+            serpentine=options.serpentine,
+            threshold_func=get_threshold_func(image, options),
+            engine=engine,
+            # more workers than cores, so that bands wait for each other
+            workers=3,
+            rcwh_func=rcwh_func,
+        ))
+
+    assert render(Engine.parallel) == render(Engine.python)
+
+
+@pytest.mark.parametrize('serpentine', (False, True))
+@pytest.mark.parametrize('method', ('atkinson', 'floyd-steinberg'))
+def test_wavefront_bands_wait_for_each_other(
+    image: Image.Image, method: DitherMethod, serpentine: bool,
+) -> None:
+    imdat = ImgData(image)
+    threshold = get_threshold_func(image, parse_args(['f.png']))
+    sx, sy, max_col, max_row = 1.5, 1.5, 30, 8
+    expected = list(pxp.render_lines(
+        imdat, sx, sy, max_col, max_row,
+        interpolate=True, threshold=threshold, dither_method=method,
+        adjust_brightness=1, dither=.8, inverted=False,
+        serpentine=serpentine, resample=Resampling.point,
+        engine=Engine.python, workers=None,
+    ))
+    setup = par.Setup(
+        '', (imdat.width, imdat.height), False, sx, sy,
+        max_col * 2, max_row * 4, True, pickle.dumps(threshold), method,
+        1, .8, False, serpentine,
+    )
+    # every band at once, bottom one first, in threads of this process
+    with (
+        par.shared(setup, imdat.pixels) as setup,
+        mock.patch.object(par, 'WORKER', None),
+        concurrent.futures.ThreadPoolExecutor(max_row) as executor,
+    ):
+        par.start_worker(setup, multiprocessing.Condition())
+        bands = list(executor.map(
+            par.render_band,
+            [range(y, y + 1) for y in reversed(range(max_row))],
+        ))
+    assert [line for band in bands[::-1] for line in band] == expected
+
+
+@pytest.mark.parametrize(
+    'method, local', (
+        ('atkinson', False),
+        ('bayer4', True),
+        ('blue-noise', True),
+    )
+)
+def test_ordered_dithering_is_local(
+    image: Image.Image, method: DitherMethod, local: bool,
+) -> None:
+    rcwh_func = lambda: (44, 80, 880, 836)  # noqa: E731
+    patched = image.copy()
+    patched.paste(255, (40, 40, 60, 60))
+
+    def render(image: Image.Image) -> list[str]:
+        return list(rasterize(
+            image, dither=1, dither_method=method, full_resolution=True,
+            threshold_func=lambda _: 127, rcwh_func=rcwh_func,
+        ))
+
+    before, after = render(image), render(patched)
+    changed = {
+        (y, x) for y, (a, b) in enumerate(zip(before, after, strict=True))
+        for x in range(len(a)) if a[x] != b[x]
+    }
+    assert changed
+    # 11×19 pixel characters, so the patch covers rows 2-3 and columns 3-5
+    assert all(
+        2 <= y <= 3 and 3 <= x <= 5 for y, x in changed
+    ) is local, sorted(changed)
+
+
+@pytest.mark.parametrize('method', ('atkinson', 'floyd-steinberg'))
+def test_serpentine_dithering(image: Image.Image, method: DitherMethod) -> None:
+    rcwh_func = lambda: (44, 80, 880, 836)  # noqa: E731
+    lines = {
+        serpentine: list(rasterize(
+            image, dither=.7, dither_method=method,
+            serpentine=serpentine, rcwh_func=rcwh_func,
+        ))
+        for serpentine in (False, True)
+    }
+    assert lines[True] != lines[False]
+    assert list(map(len, lines[True])) == list(map(len, lines[False]))
+
+
+@pytest.mark.parametrize('inverted', (False, True))
+def test_braille_row_matches_braille(inverted: bool) -> None:
+    dots = [
+        [(code >> bit) & 1 for bit in (0, 3, 1, 4, 2, 5, 6, 7)]
+        for code in range(256)
+    ]
+    rows = [
+        bytes(value for cell in dots for value in cell[dy * 2:dy * 2 + 2])
+        for dy in range(4)
+    ]
+    assert braille_row(rows, inverted=inverted) == ''.join(
+        braille(cell, inverted=inverted) for cell in dots
+    )
+
+
+@pytest.mark.parametrize(
+    'engine, dither', (
+        ('python', 0),
+        ('python', .5),
+        ('numpy', 0),
+        ('numpy', .5),
+    )
+)
+def test_rasterize_streams_rows(
+    image: Image.Image, engine: Engine, dither: float,
+) -> None:
+    pytest.importorskip('numpy')
+    imdat = ImgData(image)
+    sampled_rows: list[int] = []
+
+    def threshold(pixel: tuple[float, float]) -> float:
+        sampled_rows.append(int(pixel[1]))
+        return 127
+
+    lines = pxp.rasterize(
+        imdat, 44, 80, 880, 836,
+        zoom=4, crop_y=False, interpolate=True,
+        threshold=threshold,
+        dither_method=DitherMethod.atkinson,
+        adjust_brightness=1, dither=dither, inverted=False,
+        engine=engine,
+    )
+    assert next(iter(lines))
+    assert max(sampled_rows) < imdat.height / 8
+
+
+@pytest.mark.parametrize('method', tuple(Resampling))
+def test_resampling_dot_grid(image: Image.Image, method: Resampling) -> None:
+    imdat = ImgData(image)
+    rows = list(pxp.sample_rows(imdat, 2.5, 3.5, 80, 40, method=method))
+    assert len(rows) == 40
+    assert {len(row) for row in rows} == {80}
+    assert all(0 <= value <= 255 for row in rows for value in row)
+
+
+@mock.patch.dict(
+    'bryle.img.THRESHOLD_FUNC_FACTORIES', {
+        'diagonal': (
+            lambda image, arg: lambda pixel: (pixel[0] + pixel[1]) % 256,
+            None, None,
+        ),
+    },
+)
+def test_callable_threshold_factory(image: Image.Image) -> None:
+    pytest.importorskip('numpy')
+    threshold = get_threshold_func(
+        image, argparse.Namespace(threshold_mode='diagonal', threshold_arg=0),
+    )
+    rcwh_func = lambda: (44, 80, 880, 836)  # noqa: E731
+    lines = {
+        engine: list(rasterize(
+            image, threshold_func=threshold, engine=engine,
+            rcwh_func=rcwh_func,
+        ))
+        for engine in Engine
+    }
+    assert lines[Engine.numpy] == lines[Engine.python]
+    # lambdas can't be sent to worker processes
+    assert lines[Engine.parallel] == lines[Engine.python]
+
+
+@pytest.mark.parametrize('inputfile', ('shelly.jpg', 'eppels.png'))
+@pytest.mark.parametrize('blur_radius', (0, 20, 60, 120))
+def test_local_threshold_close_to_gaussian(
+    inputfile: str, blur_radius: int
+) -> None:
+    image = Image.open(inputfile).convert('L')
+    xs = range(0, image.width, 7)
+    ys = range(0, image.height, 7)
+    differences = [
+        abs(fast - exact)
+        for fast_row, exact_row in zip(
+            thr_local_avg_factory(image, blur_radius).rows(xs, ys),
+            thr_gaussian_factory(image, blur_radius).rows(xs, ys),
+            strict=True,
+        )
+        for fast, exact in zip(fast_row, exact_row, strict=True)
+    ]
+    assert sum(differences) / len(differences) < 1
+    assert max(differences) <= 5
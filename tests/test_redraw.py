@@ -0,0 +1,102 @@
+import random
+import re
+
+import pytest
+
+from bryle.redraw import OUTPUT_STYLE, Screen
+
+ESCAPE = re.compile(r'\x1b\[(\d*)([ABGJKm]|38;5;231m)|([\r\n])|([^\x1b\r\n]+)')
+
+
+class Terminal:
+    '''
+    bare minimum of a terminal emulator, understanding just the escape
+    sequences a `Screen` writes. with `rows`, the cursor can't move up
+    beyond the top of the screen, which shows the last `rows` lines.
+    '''
+    def __init__(self, rows: int | None = None) -> None:
+        self.grid: list[list[str]] = [[]]
+        self.row = self.col = 0
+        self.rows = rows
+
+    def line(self) -> list[str]:
+        while len(self.grid) <= self.row:
+            self.grid.append([])
+        return self.grid[self.row]
+
+    def write(self, out: str) -> None:
+        for n, command, control, text in ESCAPE.findall(out):
+            if command in ('A', 'B'):
+                self.move(int(n) if command == 'B' else -int(n))
+            elif command == 'G':
+                self.col = int(n) - 1
+            elif command == 'K':
+                del self.line()[self.col:]
+            elif command == 'J':
+                del self.grid[self.row + 1:]
+                del self.line()[self.col:]
+            elif control == '\r':
+                self.col = 0
+            elif control == '\n':
+                self.row, self.col = self.row + 1, 0
+            elif text:
+                self.put(text)
+
+    def move(self, rows: int) -> None:
+        top = len(self.grid) - self.rows if self.rows else 0
+        self.row = max(self.row + rows, min(self.row, max(top, 0)))
+
+    def put(self, text: str) -> None:
+        line = self.line()
+        line.extend(' ' * (self.col + len(text) - len(line)))
+        line[self.col:self.col + len(text)] = text
+        self.col += len(text)
+
+    def lines(self) -> list[str]:
+        return [''.join(line) for line in self.grid if line]
+
+
+def mutate(lines: list[str], changes: int, rnd: random.Random) -> list[str]:
+    cells = [list(line) for line in lines]
+    for _ in range(changes):
+        row = rnd.randrange(len(cells))
+        cells[row][rnd.randrange(len(cells[row]))] = chr(
+            0x2800 + rnd.randrange(256)
+        )
+    return [''.join(line) for line in cells]
+
+
+@pytest.mark.parametrize('changes', (0, 1, 5, 50, 500))
+def test_screen_updates_reproduce_frames(changes: int) -> None:
+    rnd = random.Random(changes)
+    lines = [
+        ''.join(chr(0x2800 + rnd.randrange(256)) for _ in range(40))
+        for _ in range(12)
+    ]
+    screen, terminal = Screen(style=OUTPUT_STYLE), Terminal()
+    terminal.write(screen.update(lines))
+    full = len('\n'.join(lines).encode())
+    for _ in range(10):
+        lines = mutate(lines, changes, rnd)
+        out = screen.update(lines)
+        terminal.write(out)
+        assert terminal.lines() == lines
+        assert (terminal.row, terminal.col) == (len(lines), 0)
+        if changes < 50:
+            assert len(out.encode()) < full / 4
+    terminal.write(screen.update(lines[:-2], diff=False))
+    assert terminal.lines() == lines[:-2]
+
+
+@pytest.mark.parametrize('diff', (False, True))
+def test_frames_taller_than_the_terminal(diff: bool) -> None:
+    rnd = random.Random(1)
+    lines = ['⠁' * 20] * 12
+    for rows in (8, 12, 13):
+        screen, terminal = Screen(rows=rows), Terminal(rows=rows)
+        for _ in range(4):
+            lines = mutate(lines, 5, rnd)
+            terminal.write(screen.update(lines, diff=diff))
+            assert terminal.lines()[-12:] == lines
+        # frames only get redrawn in place if they fit
+        assert (len(terminal.lines()) == 12) is (rows > 12)
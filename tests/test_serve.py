@@ -0,0 +1,141 @@
+import concurrent.futures
+import pathlib
+import re
+import tempfile
+import threading
+from typing import Iterable, Iterator
+from unittest import mock
+
+import pytest
+from PIL import Image
+
+from bryle import client, load_image_file, main, render
+from bryle.args import parse_args
+from bryle.client import RenderError, Request, request_lines
+from bryle.serve import RenderServer
+
+RCWH = (20, 40, 360, 380)
+
+
+@pytest.fixture(scope='module')
+def server() -> Iterable[RenderServer]:
+    with (
+        tempfile.TemporaryDirectory() as tmp,
+        RenderServer(pathlib.Path(tmp) / 'bra.sock', 2, 2) as server,
+    ):
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield server
+        server.shutdown()
+        thread.join()
+
+
+def rendered(argv: str) -> list[str]:
+    options = parse_args(argv.split())
+    return list(render(
+        load_image_file(options.inputfile), options, rcwh_func=lambda: RCWH,
+    ))
+
+
+def requested_lazily(server: RenderServer, argv: str) -> Iterator[str]:
+    return request_lines(
+        server.server_address,  # type: ignore[arg-type]
+        Request(argv.split(), RCWH, str(pathlib.Path.cwd())),
+    )
+
+
+def requested(server: RenderServer, argv: str) -> list[str]:
+    return list(requested_lazily(server, argv))
+
+
+def test_concurrent_requests(server: RenderServer) -> None:
+    argvs = [
+        f'{inputfile} {options}'
+        for inputfile in ('eppels.png', 'shelly.jpg')
+        for options in ('-e.5', '-x', '-z.5 -mgaussian', '-v -rbox')
+    ] * 2
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda argv: requested(server, argv), argvs))
+    for argv, lines in zip(argvs, results, strict=True):
+        assert lines == rendered(argv)
+    hits = server.images.hits
+    assert requested(server, argvs[0]) == requested(server, argvs[0])
+    assert server.images.hits > hits
+    assert len(server.images.entries) <= 2
+
+
+def test_request_with_image_data(server: RenderServer) -> None:
+    request = Request(
+        ['-', '-e.5'], RCWH, '/', pathlib.Path('eppels.png').read_bytes(),
+    )
+    assert list(request_lines(
+        server.server_address, request,  # type: ignore[arg-type]
+    )) == rendered('eppels.png -e.5')
+
+
+def test_palette_image_in_color(
+    server: RenderServer, tmp_path: pathlib.Path,
+) -> None:
+    inputfile = tmp_path / 'palette.png'
+    gradient = Image.linear_gradient('L').resize((720, 1280))
+    Image.merge('RGB', (
+        gradient, Image.new('L', gradient.size), gradient.rotate(90),
+    )).convert('P').save(inputfile)
+    # palette images decoded without color can't be colored later on
+    argv = f'{inputfile} -z.2'
+    assert requested(server, argv) == rendered(argv)
+    argv += ' -C truecolor'
+    lines = requested(server, argv)
+    assert lines == rendered(argv)
+    assert not all(
+        len(set(sgr.split(';')[2:])) == 1
+        for sgr in re.findall(r'\x1b\[38;[0-9;]*', ''.join(lines))
+    )
+
+
+@pytest.mark.parametrize(
+    'argv, error', (
+        ('missing.png', 'FileNotFoundError'),
+        ('-m fya eppels.png', 'invalid choice'),
+    )
+)
+def test_request_errors(server: RenderServer, argv: str, error: str) -> None:
+    with pytest.raises(RenderError, match=error):
+        requested(server, argv)
+
+
+@mock.patch.dict('os.environ', {'TERM_RCWH': 'x'.join(map(str, RCWH))})
+def test_client(
+    server: RenderServer, capsys: pytest.CaptureFixture[str],
+) -> None:
+    socket_path = str(server.server_address)
+    assert client.main([socket_path, '-e.5', 'eppels.png']) == 0
+    assert capsys.readouterr().out.splitlines() == rendered('eppels.png -e.5')
+    assert client.main([socket_path, 'missing.png']) == 1
+    assert 'FileNotFoundError' in capsys.readouterr().err
+    assert client.main([socket_path]) == 2
+
+
+def test_lines_stream_back(server: RenderServer) -> None:
+    proceed = threading.Event()
+
+    def slow_render(*args: object, **kwargs: object) -> Iterator[str]:
+        yield '⠁'
+        # only goes on once the client has got the first line
+        assert proceed.wait(5)
+        yield '⠂'
+
+    with mock.patch('bryle.serve.render', slow_render):
+        lines = iter(requested_lazily(server, 'eppels.png'))
+        assert next(lines) == '⠁'
+        proceed.set()
+        assert list(lines) == ['⠂']
+
+
+def test_running_daemon_keeps_its_socket(
+    server: RenderServer, capsys: pytest.CaptureFixture[str],
+) -> None:
+    socket_path = str(server.server_address)
+    assert main(['--serve', socket_path]) == 1
+    assert 'already listening' in capsys.readouterr().err
+    assert requested(server, 'eppels.png') == rendered('eppels.png')
@@ -0,0 +1,90 @@
+import os
+import pathlib
+import tempfile
+from typing import Iterator
+from unittest import mock
+
+import pytest
+
+from bryle import main
+from bryle.sink import Sink
+
+
+def test_partial_writes_and_oversized_rows() -> None:
+    out = bytearray()
+
+    def write(data: memoryview) -> int:
+        # like a pipe that takes at most 7 bytes at a time
+        out.extend(data[:7])
+        return min(len(data), 7)
+
+    sink = Sink(write, tty=False, size=16)
+    sink.frame(['⠁⠂', '⠃' * 8, '⠄'])
+    sink.close()
+    assert out.decode() == f'⠁⠂\n{"⠃" * 8}\n⠄\n'
+    assert sink.bytes == len(out)
+    # first row, second row in bits as it doesn't fit the buffer, last row
+    assert sink.calls == 1 + 4 + 1
+
+
+@mock.patch.dict('os.environ', {'TERM_RCWH': '20x40'})
+@pytest.mark.parametrize('trim', (False, True))
+def test_output_file(trim: bool, capsys: pytest.CaptureFixture[str]) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        outputfile = pathlib.Path(tmp) / 'out.txt'
+        outputfile.write_text('x' * 2**12)
+        main(
+            f'eppels.png -o {outputfile} -f -d -v{" --trim" * trim}'.split()
+        )
+        rows = outputfile.read_text().splitlines()
+    assert len(rows) == 8
+    assert (len(set(map(len, rows))) > 1) is trim
+    assert any(row.endswith('\u2800') for row in rows) is not trim
+    log = capsys.readouterr().err.splitlines()
+    assert log[-1] == f'wrote {sum(len(row.encode()) + 1 for row in rows)} bytes in 1 write calls'  # noqa: B950
+    assert log.count(log[0]) == 1
+
+
+def test_terminal_style() -> None:
+    read, write = os.openpty()
+    try:
+        sink = Sink.to_fd(write)
+        sink.frame(['⣿', '⣿'])
+        sink.close()
+        assert sink.tty
+        assert os.read(read, 100).count(b'\x1b[') == 2
+    finally:
+        os.close(read)
+        os.close(write)
+
+
+def test_rows_stream_into_pipes() -> None:
+    read, write = os.pipe()
+    os.set_blocking(read, False)
+    received = []
+
+    def rows() -> Iterator[str]:
+        for row in ('⠁', '⠂', '⠃'):
+            yield row
+            # every row has arrived before the next one gets rendered
+            received.append(os.read(read, 100).decode())
+
+    try:
+        sink = Sink.to_fd(write)
+        sink.frame(rows())
+        sink.close()
+        assert sink.line_buffered
+        assert received == ['⠁\n', '⠂\n', '⠃\n']
+    finally:
+        os.close(read)
+        os.close(write)
+
+
+def test_regular_files_get_whole_frames(tmp_path: pathlib.Path) -> None:
+    with (tmp_path / 'out.txt').open('wb') as f:
+        sink = Sink.to_fd(f.fileno())
+        sink.frame(['⠁', '⠂', '⠃'])
+        sink.close()
+    assert not sink.line_buffered
+    assert sink.calls == 1
+    assert (tmp_path / 'out.txt').read_text() == '⠁\n⠂\n⠃\n'
@@ -2,14 +2,57 @@ import pytest
 from PIL import Image
 
 from bryle.args import parse_args
-from bryle.img import plot_brightness_and_threshold
-from bryle.stat import BoxplotCharset, boxplot, extrema, plot
+from bryle.img import (
+    find_thresholds,
+    get_threshold_func,
+    plot_brightness_and_threshold,
+)
+from bryle.stat import BoxplotCharset, Histogram, boxplot, extrema, plot
 
 
 def test_extrema(image: Image.Image) -> None:
     assert extrema(image.histogram()) == image.getextrema()
 
 
+def test_histogram_queries(image: Image.Image) -> None:
+    counts = image.histogram()
+    values = sorted(
+        value for value, count in enumerate(counts) for _ in range(count)
+    )
+    h = Histogram(counts)
+    assert h.total == len(values)
+    assert h.mean == sum(values) // len(values)
+    for percent in range(0, 101, 5):
+        assert h.percentile(percent) == values[
+            max(0, -(-len(values) * percent // 100) - 1)
+        ], percent
+    assert h.shrink(64).counts == [
+        sum(counts[i:i + 4]) for i in range(0, 256, 4)
+    ]
+
+
+def test_merge_tiles(image: Image.Image) -> None:
+    w, h = image.size
+    tiles = [
+        image.crop((x, y, x + w // 2, y + h // 2))
+        for x in (0, w // 2) for y in (0, h // 2)
+    ]
+    merged = Histogram.merge(Histogram(tile.histogram()) for tile in tiles)
+    assert merged.counts == image.crop((0, 0, w // 2 * 2, h // 2 * 2)).histogram()
+    assert (Histogram([1]) + Histogram([0, 2])).counts == [1, 2]
+
+
+@pytest.mark.parametrize('argv', ('-mgaussian -t30 -b120', '-mconst -t 64'))
+def test_bulk_threshold_histogram(image: Image.Image, argv: str) -> None:
+    options = parse_args(['f.png'] + argv.split())  # noqa: SIM905
+    func = get_threshold_func(image, options)
+    counts = [0] * 256
+    for y in range(0, image.height, 16):
+        for x in range(0, image.width, 16):
+            counts[round(func((x, y)) * 100 / options.brightness)] += 1
+    assert find_thresholds(image, options).counts == counts
+
+
 @pytest.mark.parametrize(
     'bins, charset, expect', (
         (
@@ -56,15 +99,15 @@ def test_plot_histogram(image: Image.Image) -> None:
 @pytest.mark.parametrize(
     'argv, thresh_plot', (
         (
-            '-mlocal -t 30',
+            '-mgaussian -t 30',
             '────────┾━━━━━╋━━━┽───────'
         ),
         (
-            '-mlocal -t 50',
+            '-mgaussian -t 50',
             '──┾━╋━━┽──────'
         ),
         (
-            '-mlocal -t30 -b120',
+            '-mgaussian -t30 -b120',
             '───────┾━━━━╋━━┽─────'
         ),
         (
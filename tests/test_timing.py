@@ -0,0 +1,75 @@
+import json
+import pathlib
+import tempfile
+from unittest import mock
+
+import pytest
+
+from bryle import load_image_file, main, render
+from bryle.args import parse_args
+from bryle.timing import TIMINGS, Timings, record
+
+RCWH = (20, 40, 360, 380)
+
+
+@pytest.mark.parametrize(
+    'argv, stages', (
+        ('-e.5', ['characterize', 'dither', 'sample', 'thresholds']),
+        ('-mconst', ['characterize', 'monochrome', 'sample']),
+        ('-e.5 -Enumpy', ['vec']),
+    ),
+)
+def test_render_spans(argv: str, stages: list[str]) -> None:
+    if 'numpy' in argv:
+        pytest.importorskip('numpy')
+    spans: list[tuple[str, float]] = []
+    options = parse_args(['eppels.png', *argv.split()])
+    with record(lambda name, seconds: spans.append((name, seconds))) as t:
+        rows = list(render(
+            load_image_file('eppels.png'), options, rcwh_func=lambda: RCWH,
+        ))
+    names = {name for name, _ in spans}
+    assert {'decode', 'reduce', 'threshold', 'sharpen', 'convert'} < names
+    assert set(stages) < names
+    assert all(seconds >= 0 for _, seconds in spans)
+    assert t.spans[stages[0]].calls == len(rows) + 1
+    assert sum(span.own for span in t.spans.values()) == sum(
+        span.total for span in t.spans.values() if span.name in (
+            'decode', 'reduce', 'threshold', 'sharpen', 'convert',
+            'characterize', 'vec',
+        )
+    )
+    assert TIMINGS.get() is None
+
+
+def test_nothing_recorded_without_timings() -> None:
+    with mock.patch.object(Timings, 'span') as timed_span:
+        list(render(
+            load_image_file('eppels.png'), parse_args(['eppels.png']),
+            rcwh_func=lambda: RCWH,
+        ))
+    timed_span.assert_not_called()
+
+
+@mock.patch.dict('os.environ', {'TERM_RCWH': '20x40'})
+@pytest.mark.parametrize('timings', ('', 'table', 'json'))
+def test_timings_option(
+    timings: str, capsys: pytest.CaptureFixture[str],
+) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        outputfile = pathlib.Path(tmp) / 'out.txt'
+        main(f'eppels.png -o {outputfile} -f --timings {timings}'.split())
+        assert len(outputfile.read_text().splitlines()) == 8
+    err = capsys.readouterr().err.splitlines()
+    if timings == 'json':
+        spans = {line['span']: line for line in map(json.loads, err)}
+        # every row, and writing all of them at once
+        assert spans['output']['calls'] == 8 + 1
+        assert spans['load']['total_ms'] == spans['load']['own_ms']
+    else:
+        assert err[0].split() == [
+            'span', 'calls', 'total', 'ms', 'own', 'ms', 'own',
+        ]
+        assert {'render', 'import', 'load', 'output'} < {
+            line.split()[0] for line in err[1:]
+        }
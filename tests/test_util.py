@@ -0,0 +1,42 @@
+import pathlib
+import tempfile
+from unittest import mock
+
+import pytest
+
+from bryle import main
+from bryle.util import FALLBACK_LOG, Debug, DebugLog, Level, Message
+
+
+@mock.patch.dict('os.environ', {'TERM_RCWH': '20x40'})
+@pytest.mark.parametrize('debug', (False, True))
+def test_render_log_scope(
+    debug: bool, capsys: pytest.CaptureFixture[str],
+) -> None:
+    logged = list(FALLBACK_LOG.messages)
+    with (
+        tempfile.TemporaryDirectory() as tmp,
+        mock.patch.object(
+            Message, '__str__', autospec=True, side_effect=lambda m: m.msg,
+        ) as formatted,
+    ):
+        for _ in range(2):
+            main(f'eppels.png -o {tmp}/out.txt -f{" -d" * debug}'.split())
+            assert pathlib.Path(f'{tmp}/out.txt').stat().st_size
+    assert list(FALLBACK_LOG.messages) == logged
+    err = capsys.readouterr().err
+    assert formatted.call_count == len(err.splitlines())
+    # every render shows its own log only
+    assert err.count('input file: %s\n') == (2 if debug else 0)
+
+
+def test_log_levels() -> None:
+    with Debug.scope(level=Level.info, size=3) as log:
+        Debug.log('a').log('b', level=Level.info)
+        Debug.log('c %s', 'd', level=Level.warning)
+    assert isinstance(log, DebugLog)
+    assert log.lines() == ['b', 'warning: c d']
+    with Debug.scope(enabled=False) as nothing:
+        Debug.log('e')
+        assert nothing is None
+        assert Debug.lines() == []
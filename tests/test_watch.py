@@ -0,0 +1,85 @@
+import io
+import os
+import pathlib
+import tempfile
+from typing import Callable, Iterable
+
+import pytest
+
+from bryle import main
+from bryle.args import parse_args
+from bryle.util import Debug
+from bryle.watch import changes, watch
+
+
+@pytest.fixture
+def watched() -> Iterable[pathlib.Path]:
+    with tempfile.TemporaryDirectory() as tmp:
+        yield pathlib.Path(tmp) / 'plot.png'
+
+
+def scripted(*actions: Callable[[], object]) -> Callable[[float], None]:
+    script = list(actions)
+
+    def sleep(seconds: float) -> None:
+        if not script:
+            raise KeyboardInterrupt
+        script.pop(0)()
+    return sleep
+
+
+def test_changes_skips_files_being_written(watched: pathlib.Path) -> None:
+    content = pathlib.Path('eppels.png').read_bytes()
+    sleep = scripted(
+        lambda: None,
+        lambda: watched.write_bytes(content[:100]),
+        lambda: watched.write_bytes(content),
+        lambda: None,
+    )
+    with pytest.raises(KeyboardInterrupt):
+        assert [len(c) for c in changes(watched, 1, sleep=sleep)] == []
+    watched.write_bytes(content[:10])
+    sleep = scripted(
+        lambda: watched.write_bytes(content[:100]),
+        lambda: watched.write_bytes(content),
+        lambda: None,
+    )
+    assert next(changes(watched, 1, sleep=sleep)) == content
+
+
+def test_watch_renders_changes_only(watched: pathlib.Path) -> None:
+    eppels = pathlib.Path('eppels.png').read_bytes()
+    shelly = pathlib.Path('shelly.jpg').read_bytes()
+    watched.write_bytes(eppels)
+    stat = watched.stat()
+    sleep = scripted(
+        lambda: None,
+        lambda: watched.write_bytes(shelly[:1000]),
+        lambda: watched.write_bytes(shelly),
+        lambda: None,
+        lambda: os.utime(watched, ns=(stat.st_atime_ns, stat.st_mtime_ns)),
+        lambda: None,
+        lambda: watched.write_bytes(b'fya'),
+        lambda: None,
+    )
+    out = io.StringIO()
+    options = parse_args(f'{watched} -W -z .1'.split())
+    renders = []
+    with Debug.scope() as debug_log, pytest.raises(KeyboardInterrupt):
+        for renders_so_far in watch(
+            watched, options, out,  # type: ignore[arg-type]
+            rcwh_func=lambda: (20, 40, 360, 380), sleep=sleep,
+        ):
+            renders.append(renders_so_far)
+    assert renders == [1, 2]
+    assert len(out.getvalue().splitlines()) == 1 + 7
+    assert debug_log
+    log = '\n'.join(debug_log.lines())
+    assert 'is still being written to' in log
+    assert 'changed without changing its contents' in log
+    assert 'failed to render' in log
+
+
+def test_watch_stdin() -> None:
+    with pytest.raises(SystemExit, match='needs a file'):
+        main(['-', '-W'])
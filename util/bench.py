@@ -0,0 +1,365 @@
+import argparse
+import concurrent.futures
+import contextlib
+import itertools
+import json
+import pathlib
+import resource
+import sys
+import tempfile
+from dataclasses import asdict, dataclass
+from typing import Any, Iterator
+
+from PIL import Image
+
+from bryle.args import DitherMethod, parse_args
+from bryle.img import THRESHOLD_FUNC_FACTORIES
+from bryle.pipeline import load_image_file, prepare_image, render
+from bryle.timing import TIMINGS, Span, Timings, span
+from bryle.util import Debug
+
+RCWH = (44, 174, 1914, 1012)
+PROC_STATUS = pathlib.Path('/proc/self/status')
+# writing 5 resets the peak resident set size of the process (linux 4.0+)
+PROC_CLEAR_REFS = pathlib.Path('/proc/self/clear_refs')
+BUNDLED = ('eppels.png', 'shelly.jpg')
+SIZES = {
+    'thumb': (160, 120),
+    '1mp': (1280, 800),
+    '12mp': (4000, 3000),
+    '50mp': (8660, 5774),
+}
+# command line options for every value of every axis of the matrix
+DITHERS: dict[str, list[str]] = {'nodither': []} | {
+    str(method): ['-e1', f'-D{method}'] for method in DitherMethod
+}
+SHARPENS = {f'a{level}': ['-a'] * level for level in range(3)}
+ALIASING = {'aa': [], 'noaa': ['-A']}
+
+
+@dataclass
+class Case:
+    name: str
+    path: str
+    argv: list[str]
+
+
+@dataclass
+class Stage:
+    seconds: float
+    peak_rss: int
+
+
+@dataclass
+class Measurement:
+    stages: dict[str, Stage]
+    dots: int
+
+    @property
+    def seconds(self) -> float:
+        return sum(stage.seconds for stage in self.stages.values())
+
+    @property
+    def dots_per_second(self) -> float:
+        return self.dots / self.seconds
+
+    def to_json(self) -> dict[str, Any]:
+        return asdict(self) | {
+            'seconds': self.seconds, 'dots_per_second': self.dots_per_second,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> 'Measurement':
+        return cls(
+            {name: Stage(**stage) for name, stage in data['stages'].items()},
+            data['dots'],
+        )
+
+
+def synthetic_image(size: tuple[int, int]) -> Image.Image:
+    '''
+    gradients overlaid with noise, so that every threshold mode has some
+    structure as well as some texture to work with.
+    '''
+    gradients = Image.blend(
+        Image.linear_gradient('L').resize(size),
+        Image.radial_gradient('L').resize(size),
+        .5,
+    )
+    return Image.blend(gradients, Image.effect_noise(size, 48), .3)
+
+
+def generate_images(
+    directory: pathlib.Path, sizes: list[str],
+) -> dict[str, pathlib.Path]:
+    images = {name: pathlib.Path(name) for name in BUNDLED}
+    for name in sizes:
+        images[name] = directory / f'{name}.jpg'
+        synthetic_image(SIZES[name]).save(images[name], quality=90)
+    return images
+
+
+def cases(images: dict[str, pathlib.Path]) -> Iterator[Case]:
+    '''
+    every combination of image, zoom, threshold mode, dithering, sharpening
+    and antialiasing. `fill2` zooms images to twice the terminal width.
+    '''
+    for image, path in images.items():
+        with Image.open(path) as f:
+            zooms = {'fit': ['-x'], 'fill2': [f'-z{2 * RCWH[2] / f.width:.4f}']}
+        for (zoom, zoom_argv), threshold, (dither, dither_argv), (
+            sharpen, sharpen_argv,
+        ), (aliasing, aliasing_argv) in itertools.product(
+            zooms.items(), THRESHOLD_FUNC_FACTORIES, DITHERS.items(),
+            SHARPENS.items(), ALIASING.items(),
+        ):
+            yield Case(
+                f'{image}/{zoom}/{threshold}/{dither}/{sharpen}/{aliasing}',
+                str(path),
+                [
+                    *zoom_argv, f'-m{threshold}', *dither_argv,
+                    *sharpen_argv, *aliasing_argv,
+                ],
+            )
+
+
+def peak_rss() -> int:
+    '''
+    peak resident set size since the last `reset_peak_rss`, or since the
+    process started where the peak can't be reset.
+    '''
+    with contextlib.suppress(OSError):
+        for line in PROC_STATUS.read_text().splitlines():
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss() -> None:
+    with contextlib.suppress(OSError):
+        PROC_CLEAR_REFS.write_text('5')
+
+
+class MemoryTimings(Timings):
+    '''
+    timings which also keep the peak resident set size during every span.
+    the peak gets reset whenever a span starts or ends, so that spans only
+    see peaks of their own and of spans nested within.
+    '''
+    def __init__(self) -> None:
+        super().__init__()
+        self.peaks: dict[str, int] = {}
+
+    def fold(self) -> None:
+        peak = peak_rss()
+        for open_span in self.stack:
+            self.peaks[open_span.name] = max(
+                self.peaks.get(open_span.name, 0), peak,
+            )
+        reset_peak_rss()
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        self.fold()
+        with super().span(name) as current:
+            try:
+                yield current
+            finally:
+                self.fold()
+
+
+def render_case(
+    case: Case, options: argparse.Namespace, timings: Timings,
+) -> int:
+    '''
+    render `case` with timings recorded into `timings`, and return the
+    number of dots rendered.
+    '''
+    token = TIMINGS.set(timings)
+    try:
+        with Debug.scope(enabled=False):
+            with span('load'):
+                image = load_image_file(case.path)
+            image, zoom = prepare_image(
+                image, options, rcwh_func=lambda: RCWH,
+            )
+            rows = list(
+                render(image, options, rcwh_func=lambda: RCWH, zoom=zoom)
+            )
+    finally:
+        TIMINGS.reset(token)
+    return sum(len(row) for row in rows) * 8
+
+
+def measure(case: Case, repeat: int) -> Measurement:
+    '''
+    fastest own time in `repeat` runs of every pipeline stage (load, decode,
+    reduce, threshold, sharpen, sample, dither, characterize, ...), and its
+    peak resident set size in one more run, as tracking memory slows down
+    stages that run once per row.
+    '''
+    options = parse_args([case.path, *case.argv])
+    seconds: dict[str, float] = {}
+    for _ in range(repeat):
+        timings = Timings()
+        dots = render_case(case, options, timings)
+        for name, stage in timings.spans.items():
+            seconds[name] = min(seconds.get(name, stage.own), stage.own)
+    memory = MemoryTimings()
+    render_case(case, options, memory)
+    return Measurement(
+        {
+            name: Stage(own / 1e9, memory.peaks.get(name, 0))
+            for name, own in seconds.items()
+        },
+        dots,
+    )
+
+
+def run(
+    cases: list[Case], repeat: int,
+) -> Iterator[tuple[Case, Measurement]]:
+    with concurrent.futures.ProcessPoolExecutor(
+        1, max_tasks_per_child=1,
+    ) as executor:
+        yield from zip(
+            cases,
+            executor.map(measure, cases, itertools.repeat(repeat)),
+            strict=True,
+        )
+
+
+def regressions(
+    baseline: dict[str, Measurement], results: dict[str, Measurement],
+    tolerance: float,
+) -> Iterator[str]:
+    '''
+    stages of cases which got slower than their baseline by more than
+    `tolerance`. cases missing from the baseline don't count.
+
+    >>> baseline = {'thumb/fit': Measurement({
+    ...     'decode': Stage(.01, 2**20), 'render': Stage(.2, 2**20),
+    ... }, 400)}
+    >>> results = {'thumb/fit': Measurement({
+    ...     'decode': Stage(.0105, 2**20), 'render': Stage(.25, 2**20),
+    ... }, 400), 'thumb/noaa': baseline['thumb/fit']}
+    >>> list(regressions(baseline, results, .1))
+    ['thumb/fit render: 0.2000 s -> 0.2500 s (+25%)']
+    '''
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for stage, current in result.stages.items():
+            before = baseline[name].stages.get(stage)
+            if before and current.seconds > before.seconds * (1 + tolerance):
+                yield (
+                    f'{name} {stage}: {before.seconds:.4f} s -> '
+                    f'{current.seconds:.4f} s '
+                    f'(+{current.seconds / before.seconds - 1:.0%})'
+                )
+
+
+def report(name: str, measurement: Measurement) -> str:
+    '''
+    >>> report('thumb/fit', Measurement({
+    ...     'decode': Stage(.01, 2**25), 'sample': Stage(.19, 2**26),
+    ... }, 400000))
+    'thumb/fit  0.200 s  2.00 Mdots/s  decode 0.010 s 32 MiB  sample 0.190 s 64 MiB'
+    '''
+    stages = '  '.join(
+        f'{stage} {m.seconds:.3f} s {m.peak_rss // 2**20} MiB'
+        for stage, m in measurement.stages.items()
+    )
+    return (
+        f'{name}  {measurement.seconds:.3f} s  '
+        f'{measurement.dots_per_second / 1e6:.2f} Mdots/s  {stages}'
+    )
+
+
+def parse_bench_args(argv: list[str]) -> argparse.Namespace:
+    argp = argparse.ArgumentParser(
+        description=(
+            'time and measure memory use of rendering every combination of '
+            'test image, zoom, threshold mode, dithering, sharpening and '
+            'antialiasing.'
+        ),
+    )
+    argp.add_argument(
+        '-k', dest='match', default='', metavar='TEXT',
+        help='only run cases whose name contains TEXT, e.g. "thumb/fit/".',
+    )
+    argp.add_argument(
+        '--sizes', default=','.join(SIZES), type=lambda s: s.split(','),
+        help=f'synthetic images to generate (default: {",".join(SIZES)}).',
+    )
+    argp.add_argument(
+        '--repeat', default=3, type=int,
+        help='number of runs per case, the fastest counts (default: 3).',
+    )
+    argp.add_argument(
+        '--baseline', type=pathlib.Path, metavar='FILE',
+        help='report stages which got slower than in this baseline.',
+    )
+    argp.add_argument(
+        '--tolerance', default=.1, type=float,
+        help='slowdown not to report as regression (default: 0.1).',
+    )
+    argp.add_argument(
+        '--save', type=pathlib.Path, metavar='FILE',
+        help='store results as baseline.',
+    )
+    return argp.parse_args(argv)
+
+
+def test_thumbnail_cases() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        images = generate_images(pathlib.Path(tmp), ['thumb'])
+        selected = [
+            case for case in cases(images)
+            if case.name.startswith('thumb/fit/const/')
+        ]
+        results = list(run(selected[:2], repeat=1))
+    assert len(selected) == len(DITHERS) * len(SHARPENS) * len(ALIASING)
+    assert selected[1].argv == ['-x', '-mconst', '-A']
+    for _, measurement in results:
+        assert measurement.dots > 0
+        assert {
+            'load', 'decode', 'threshold', 'sample', 'characterize',
+        } < set(measurement.stages)
+        assert all(
+            stage.peak_rss > 0 for stage in measurement.stages.values()
+        )
+
+
+def main(argv: list[str] = sys.argv[1:]) -> int:
+    args = parse_bench_args(argv)
+    baseline = {}
+    if args.baseline:
+        baseline = {
+            name: Measurement.from_json(data) for name, data in
+            json.loads(args.baseline.read_text())['results'].items()
+        }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        images = generate_images(pathlib.Path(tmp), args.sizes)
+        selected = [case for case in cases(images) if args.match in case.name]
+        for case, measurement in run(selected, args.repeat):
+            results[case.name] = measurement
+            print(report(case.name, measurement), flush=True)
+    if args.save:
+        baseline_data = {
+            'python': sys.version.split()[0], 'rcwh': RCWH,
+            'results': {
+                name: measurement.to_json()
+                for name, measurement in results.items()
+            },
+        }
+        args.save.write_text(json.dumps(baseline_data, indent=1))
+    slower = list(regressions(baseline, results, args.tolerance))
+    for regression in slower:
+        print(regression, file=sys.stderr)
+    return 1 if slower else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
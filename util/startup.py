@@ -0,0 +1,142 @@
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+
+# time in ms a scenario may take at most beyond starting a bare interpreter
+BUDGET_MS = 50.0
+ENTRY = 'import sys; from bryle import main; sys.exit(main(sys.argv[1:]))'
+# modules that mustn't be imported before rendering actually begins
+DEFERRED = ('PIL', 'bryle.img', 'bryle.pxp', 'bryle.pipeline')
+
+
+@dataclass
+class Startup:
+    wall_ms: float
+    imports: dict[str, int]
+
+    @property
+    def import_ms(self) -> float:
+        return self.imports.get('bryle', 0) / 1000
+
+    def deferred(self) -> list[str]:
+        return sorted(
+            module for module in self.imports
+            if any(
+                module == name or module.startswith(f'{name}.')
+                for name in DEFERRED
+            )
+        )
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    '''
+    cumulative import time in µs by module, from `python -X importtime`.
+
+    >>> parse_importtime("""import time: self [us] | cumulative | imported package
+    ... import time:        91 |         91 |     bryle.util
+    ... import time:       345 |        436 | bryle
+    ... bryle: error: unrecognized arguments""")
+    {'bryle.util': 91, 'bryle': 436}
+    '''
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, module = line.split('|')
+        imports[module.strip()] = int(cumulative)
+    return imports
+
+
+def wall_ms(code: str, argv: list[str], repeat: int) -> float:
+    '''
+    median wall clock time of running python code `repeat` times.
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code, *argv], capture_output=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def measure(argv: list[str], repeat: int) -> Startup:
+    '''
+    imports get profiled by a separate run, as `-X importtime` slows them
+    down too much to be timed along with them.
+    '''
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', ENTRY, *argv],
+        capture_output=True, encoding='utf8',
+    )
+    return Startup(
+        wall_ms(ENTRY, argv, repeat), parse_importtime(proc.stderr),
+    )
+
+
+def scenarios(cache_dir: str) -> dict[str, list[str]]:
+    return {
+        'help': ['--help'],
+        'argument error': ['-m', 'fya', 'eppels.png'],
+        'cache hit': [
+            'eppels.png', '-o', '/dev/null', '-f', '--cache', cache_dir,
+        ],
+    }
+
+
+def run(repeat: int = 9) -> dict[str, Startup]:
+    '''
+    measure every scenario after running it once, which fills the render
+    cache for the cache hit scenario as well as the os' file cache.
+    '''
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, argv in scenarios(cache_dir).items():
+            wall_ms(ENTRY, argv, 1)
+            results[name] = measure(argv, repeat)
+    return results
+
+
+def report(
+    results: dict[str, Startup], baseline_ms: float, budget_ms: float,
+) -> list[str]:
+    '''
+    >>> report({'help': Startup(32.5, {'bryle': 3100})}, 20, 50)
+    ['help             32.5 ms wall  +12.5 ms  3.1 ms bryle imports  ok']
+    >>> report({'-h': Startup(80, {'bryle': 9000, 'PIL': 1})}, 20, 50)[0][54:]
+    'imports  over budget, imports PIL'
+    '''
+    lines = []
+    for name, startup in results.items():
+        overhead_ms = startup.wall_ms - baseline_ms
+        problems = ['over budget'] if overhead_ms > budget_ms else []
+        if deferred := startup.deferred():
+            problems.append(f'imports {", ".join(deferred)}')
+        lines.append(
+            f'{name:<15}{startup.wall_ms:6.1f} ms wall {overhead_ms:+6.1f} ms '
+            f'{startup.import_ms:4.1f} ms bryle imports  '
+            f'{", ".join(problems) or "ok"}'
+        )
+    return lines
+
+
+def test_nothing_deferred_gets_imported() -> None:
+    for startup in run(repeat=1).values():
+        assert 'bryle' in startup.imports
+        assert startup.deferred() == []
+
+
+def main(budget_ms: float = BUDGET_MS) -> int:
+    baseline_ms = wall_ms('pass', [], 9)
+    print(
+        f'python {sys.version.split()[0]}: {baseline_ms:.1f} ms to start, '
+        f'budget +{budget_ms:.0f} ms'
+    )
+    lines = report(run(), baseline_ms, budget_ms)
+    print(*lines, sep='\n')
+    return 1 if any(not line.endswith(' ok') for line in lines) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*map(float, sys.argv[1:2])))